@@ -1,60 +1,1034 @@
-
 #Elizabeth Dorfman
 #Implementation of the Bellman-Ford algorithm for finding the shortest paths in a weighted network.
 
+import argparse
+import heapq
 import math
+import mmap
+import multiprocessing
+import os
+import struct
 import sys
+from array import array
+from collections import deque
+from multiprocessing import shared_memory
+
+# NumPy is optional, only the "numpy" engine needs it
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+ENGINES = ("python", "numpy", "spfa")
+FORMATS = ("matrix", "edges")
+ALL_PAIRS_ENGINES = ("auto", "floyd-warshall", "johnson")
+
+# Edge density (edges / V^2) above which all-pairs uses Floyd-Warshall
+DENSE_THRESHOLD = 0.1
+
+
+class SparseGraph:
+    # Compressed sparse row graph, the out edges of node u are
+    # targets[offsets[u]:offsets[u + 1]] with the matching weights
+    def __init__(self, num_nodes, offsets, targets, weights):
+        self.num_nodes = num_nodes
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+
+    @classmethod
+    def from_edges(cls, num_nodes, sources, targets, weights):
+        # Counting sort of the edges by source node, O(V + E)
+        offsets = array("q", bytes(8 * (num_nodes + 1)))
+        for from_node in sources:
+            offsets[from_node + 1] += 1
+        for node in range(num_nodes):
+            offsets[node + 1] += offsets[node]
+
+        next_slot = array("q", offsets[:-1])
+        sorted_targets = array("q", bytes(8 * len(targets)))
+        sorted_weights = array("d", bytes(8 * len(weights)))
+        for from_node, to_node, weight in zip(sources, targets, weights):
+            slot = next_slot[from_node]
+            sorted_targets[slot] = to_node
+            sorted_weights[slot] = weight
+            next_slot[from_node] += 1
+        return cls(num_nodes, offsets, sorted_targets, sorted_weights)
+
+    @classmethod
+    def from_matrix(cls, matrix):
+        sources, targets, weights = array("q"), array("q"), array("d")
+        for from_node, row in enumerate(dense_rows(matrix)):
+            for to_node, weight in enumerate(row):
+                if weight != math.inf:
+                    sources.append(from_node)
+                    targets.append(to_node)
+                    weights.append(weight)
+        return cls.from_edges(len(matrix), sources, targets, weights)
+
+    def __len__(self):
+        return self.num_nodes
+
+    @property
+    def num_edges(self):
+        return len(self.targets)
+
+    def out_edges(self, from_node):
+        for slot in range(self.offsets[from_node], self.offsets[from_node + 1]):
+            yield self.targets[slot], self.weights[slot]
+
+    def edges(self):
+        for from_node in range(self.num_nodes):
+            for to_node, weight in self.out_edges(from_node):
+                yield from_node, to_node, weight
+
+    def to_matrix(self):
+        matrix = [[math.inf] * self.num_nodes for node in range(self.num_nodes)]
+        for from_node, to_node, weight in self.edges():
+            matrix[from_node][to_node] = min(matrix[from_node][to_node], weight)
+        return matrix
+
+
+def read_edge_list(lines):
+    # First line is the number of nodes, then one "src dst weight" edge per line.
+    # Lines are consumed one at a time so the dense matrix is never built
+    lines = iter(lines)
+    num_nodes = int(next(lines))
+    sources, targets, weights = array("q"), array("q"), array("d")
+    for line in lines:
+        fields = line.split()
+        if not fields or fields[0].startswith("#"):
+            continue
+        from_node, to_node = int(fields[0]), int(fields[1])
+        if not (0 <= from_node < num_nodes and 0 <= to_node < num_nodes):
+            raise ValueError(f"Edge {from_node} -> {to_node} is outside 0..{num_nodes - 1}")
+        sources.append(from_node)
+        targets.append(to_node)
+        weights.append(float(fields[2]))
+    return SparseGraph.from_edges(num_nodes, sources, targets, weights)
+
+
+def read_matrix(lines):
+    # First line is the number of nodes, then V*V cells in row order, "f" is no edge
+    matrix_data = list(lines)
+
+    num_nodes = int(matrix_data[0])
+
+    matrix = []
+
+    for row_index in range(num_nodes):
+        matrix.append([])
+        for col_index in range(num_nodes):
+            num_to_insert = matrix_data[1 + row_index * num_nodes + col_index].strip()
+            if num_to_insert == "f":
+                matrix[row_index].append(float("inf"))
+            else:
+                matrix[row_index].append(int(num_to_insert))
+
+    return matrix
+
+
+class ShortestPaths:
+    # Result of one source: distances, a compact predecessor array (-1 for
+    # the source and unreachable nodes) and the nodes of a reachable
+    # negative cycle, in which case distances is a row of None
+    def __init__(self, source_node, distances, predecessors, negative_cycle=None):
+        self.source_node = source_node
+        self.distances = distances
+        self.predecessors = predecessors
+        self.negative_cycle = negative_cycle
+
+    def path_to(self, dest_node):
+        return reconstruct_path(self.predecessors, self.source_node, dest_node)
+
+
+def calc_bellman_ford(graph, source_node, engine="python", early_exit=False):
+    return calc_shortest_paths(graph, source_node, engine, early_exit).distances
+
+
+def calc_shortest_paths(graph, source_node, engine="python", early_exit=False):
+    # Dispatch to the requested engine, the pure Python loop is the reference.
+    # With early_exit the passes stop once a whole pass changes no distance
+    if engine == "python":
+        return calc_bellman_ford_python(graph, source_node, early_exit)
+    elif engine == "numpy":
+        return calc_bellman_ford_numpy(graph, source_node, early_exit)
+    elif engine == "spfa":
+        return calc_bellman_ford_spfa(graph, source_node)
+    raise ValueError(f"Unknown Bellman-Ford engine: {engine}")
+
+
+def calc_bellman_ford_python(graph, source_node, early_exit=False):
+    if isinstance(graph, SparseGraph):
+        return calc_bellman_ford_sparse(graph, source_node, early_exit)
 
-def calc_bellman_ford(source_node):
+    graph = dense_rows(graph)
+    num_nodes = len(graph)
     distances = [math.inf] * num_nodes
     distances[source_node] = 0
+    predecessors = array("q", [-1]) * num_nodes
 
     for iteration in range(num_nodes - 1):
+        changed = False
         for from_node in range(num_nodes):
             for to_node in range(num_nodes):
-                if matrix[from_node][to_node] != math.inf:
+                if graph[from_node][to_node] != math.inf:
                     if (
-                        distances[from_node] + matrix[from_node][to_node]
+                        distances[from_node] + graph[from_node][to_node]
                         < distances[to_node]
                     ):
                         distances[to_node] = (
-                            distances[from_node] + matrix[from_node][to_node]
+                            distances[from_node] + graph[from_node][to_node]
                         )
+                        predecessors[to_node] = from_node
+                        changed = True
+        # A pass without changes means the distances are final and no
+        # negative cycle is reachable
+        if early_exit and not changed:
+            break
+    else:
+        for from_node in range(num_nodes):
+            for to_node in range(num_nodes):
+                if graph[from_node][to_node] != math.inf:
+                    if (
+                        distances[from_node] + graph[from_node][to_node]
+                        < distances[to_node]
+                    ):
+                        predecessors[to_node] = from_node
+                        return negative_cycle_result(
+                            graph, source_node, predecessors, to_node
+                        )
+
+    # Cached or shared graphs hold float weights, report them like the text input
+    return ShortestPaths(source_node, to_python_distances(distances), predecessors)
+
+
+def calc_bellman_ford_sparse(graph, source_node, early_exit=False):
+    # Same relaxation as the reference loop but over the edge list, O(V*E)
+    num_nodes = len(graph)
+    offsets, targets, weights = graph.offsets, graph.targets, graph.weights
+    distances = [math.inf] * num_nodes
+    distances[source_node] = 0
+    predecessors = array("q", [-1]) * num_nodes
+
+    for iteration in range(num_nodes - 1):
+        changed = False
+        for from_node in range(num_nodes):
+            from_distance = distances[from_node]
+            if from_distance == math.inf:
+                continue
+            for slot in range(offsets[from_node], offsets[from_node + 1]):
+                if from_distance + weights[slot] < distances[targets[slot]]:
+                    distances[targets[slot]] = from_distance + weights[slot]
+                    predecessors[targets[slot]] = from_node
+                    changed = True
+        if early_exit and not changed:
+            break
+    else:
+        for from_node, to_node, weight in graph.edges():
+            if distances[from_node] + weight < distances[to_node]:
+                predecessors[to_node] = from_node
+                return negative_cycle_result(
+                    graph, source_node, predecessors, to_node, fallback=False
+                )
+
+    return ShortestPaths(source_node, to_python_distances(distances), predecessors)
+
+
+def calc_bellman_ford_numpy(graph, source_node, early_exit=False):
+    if np is None:
+        raise RuntimeError("The numpy engine requires NumPy to be installed")
+    if isinstance(graph, SparseGraph):
+        return calc_bellman_ford_numpy_sparse(graph, source_node, early_exit)
+
+    num_nodes = len(graph)
+    weights = np.asarray(graph, dtype=np.float64)
+    distances = np.full(num_nodes, np.inf)
+    distances[source_node] = 0
+    predecessors = np.full(num_nodes, -1, dtype=np.int64)
+    to_nodes = np.arange(num_nodes)
+
+    # Each pass relaxes every edge at once with a min-plus step:
+    # candidate[to] = min over from of distances[from] + weights[from][to]
+    # and the argmin is the predecessor of every improved node.
+    # The extra V-th pass improving a distance means a negative cycle
+    for iteration in range(num_nodes):
+        totals = distances[:, None] + weights
+        from_nodes = totals.argmin(axis=0)
+        candidates = totals[from_nodes, to_nodes]
+        improved = candidates < distances
+        if not improved.any():
+            if early_exit or iteration == num_nodes - 1:
+                break
+            continue
+        distances[improved] = candidates[improved]
+        predecessors[improved] = from_nodes[improved]
+        if iteration == num_nodes - 1:
+            return negative_cycle_result(
+                graph,
+                source_node,
+                array("q", predecessors.tobytes()),
+                int(improved.argmax()),
+            )
+
+    return ShortestPaths(
+        source_node, to_python_distances(distances), array("q", predecessors.tobytes())
+    )
+
+
+def calc_bellman_ford_numpy_sparse(graph, source_node, early_exit=False):
+    num_nodes = len(graph)
+    offsets = np.frombuffer(graph.offsets, dtype=np.int64)
+    sources = np.repeat(np.arange(num_nodes), np.diff(offsets))
+    targets = np.frombuffer(graph.targets, dtype=np.int64)
+    weights = np.frombuffer(graph.weights, dtype=np.float64)
+    distances = np.full(num_nodes, np.inf)
+    distances[source_node] = 0
+    predecessors = np.full(num_nodes, -1, dtype=np.int64)
+
+    # Scatter-min of every edge's candidate distance onto its target, O(E) per
+    # pass, an edge whose candidate became the new distance is the predecessor
+    for iteration in range(num_nodes):
+        totals = distances[sources] + weights
+        previous = distances.copy()
+        np.minimum.at(distances, targets, totals)
+        improved = distances < previous
+        if not improved.any():
+            if early_exit or iteration == num_nodes - 1:
+                break
+            continue
+        tight = improved[targets] & (totals == distances[targets])
+        predecessors[targets[tight]] = sources[tight]
+        if iteration == num_nodes - 1:
+            return negative_cycle_result(
+                graph,
+                source_node,
+                array("q", predecessors.tobytes()),
+                int(improved.argmax()),
+            )
+
+    return ShortestPaths(
+        source_node, to_python_distances(distances), array("q", predecessors.tobytes())
+    )
+
+
+def calc_bellman_ford_spfa(graph, source_node):
+    # Queue based Bellman-Ford (SPFA), only the out edges of nodes whose
+    # distance just improved are relaxed again
+    graph = dense_rows(graph)
+    num_nodes = len(graph)
+    adjacency = out_edge_lists(graph)
+    distances = [math.inf] * num_nodes
+    distances[source_node] = 0
+    predecessors = array("q", [-1]) * num_nodes
+    # Number of edges on the current best path to each node, a path of
+    # num_nodes edges repeats a node, so it can only come from a negative cycle
+    path_lengths = [0] * num_nodes
+    in_queue = [False] * num_nodes
+    queue = deque([source_node])
+    in_queue[source_node] = True
+
+    while queue:
+        from_node = queue.popleft()
+        in_queue[from_node] = False
+        from_distance = distances[from_node]
+        for to_node, weight in adjacency[from_node]:
+            if from_distance + weight < distances[to_node]:
+                distances[to_node] = from_distance + weight
+                predecessors[to_node] = from_node
+                path_lengths[to_node] = path_lengths[from_node] + 1
+                if path_lengths[to_node] >= num_nodes:
+                    return negative_cycle_result(
+                        graph, source_node, predecessors, to_node
+                    )
+                if not in_queue[to_node]:
+                    in_queue[to_node] = True
+                    queue.append(to_node)
+
+    return ShortestPaths(source_node, to_python_distances(distances), predecessors)
+
+
+def out_edge_lists(graph):
+    # [(to_node, weight), ...] for every node, from either representation
+    num_nodes = len(graph)
+    if isinstance(graph, SparseGraph):
+        return [list(graph.out_edges(node)) for node in range(num_nodes)]
+    return [
+        [(to_node, weight) for to_node, weight in enumerate(row) if weight != math.inf]
+        for row in dense_rows(graph)
+    ]
+
+
+def dense_rows(graph):
+    # A cached or shared dense graph is an ndarray for the numpy engine, but reading
+    # it one element at a time is several times slower than a list, so the pure
+    # Python loops convert it to lists once per call
+    if np is not None and isinstance(graph, np.ndarray):
+        return graph.tolist()
+    return graph
+
+
+def negative_cycle_result(
+    graph, source_node, predecessors, relaxed_node, fallback=True
+):
+    num_nodes = len(graph)
+    cycle = find_negative_cycle(predecessors, relaxed_node)
+    if cycle is None and fallback:
+        # Stale predecessors can miss the cycle (the queue based engine stops
+        # on path length), the sequential passes always leave it in place
+        if not isinstance(graph, SparseGraph):
+            graph = SparseGraph.from_matrix(graph)
+        cycle = calc_bellman_ford_sparse(graph, source_node).negative_cycle
+    return ShortestPaths(source_node, [None] * num_nodes, predecessors, cycle)
+
+
+def find_negative_cycle(predecessors, relaxed_node):
+    # Walking back num_nodes predecessors from a node relaxed after the last
+    # pass lands on the cycle, then follow it around once
+    node = relaxed_node
+    for step in range(len(predecessors)):
+        node = predecessors[node]
+        if node == -1:
+            return None
+    cycle = [node]
+    node = predecessors[node]
+    while node != cycle[0]:
+        if node == -1 or len(cycle) > len(predecessors):
+            return None
+        cycle.append(node)
+        node = predecessors[node]
+    # Predecessors run backwards, list the cycle in edge order from its smallest node
+    cycle.reverse()
+    start = cycle.index(min(cycle))
+    return cycle[start:] + cycle[:start]
 
-    for from_node in range(num_nodes):
-        for to_node in range(num_nodes):
-            if matrix[from_node][to_node] != math.inf:
-                if (
-                    distances[from_node] + matrix[from_node][to_node]
-                    < distances[to_node]
-                ):
-                    return [None] * num_nodes
 
+def reachable_nodes(adjacency, source_node):
+    # Every node with a path from source_node, by breadth first search over out_edge_lists
+    reachable = {source_node}
+    queue = deque([source_node])
+    while queue:
+        for to_node, weight in adjacency[queue.popleft()]:
+            if to_node not in reachable:
+                reachable.add(to_node)
+                queue.append(to_node)
+    return reachable
+
+
+def reconstruct_path(predecessors, source_node, dest_node):
+    # Nodes from source to dest following the predecessor array, None when
+    # dest is unreachable
+    path = [dest_node]
+    while path[-1] != source_node:
+        node = predecessors[path[-1]]
+        if node == -1 or len(path) > len(predecessors):
+            return None
+        path.append(node)
+    path.reverse()
+    return path
+
+
+def to_python_distances(distances):
+    # Convert engine output to the same values the reference loop produces
+    values = []
+    for distance in distances:
+        distance = float(distance)
+        if distance == math.inf:
+            values.append(math.inf)
+        elif distance.is_integer():
+            values.append(int(distance))
+        else:
+            values.append(distance)
+    return values
+
+
+def edge_list(graph):
+    # (from_node, to_node, weight) for every finite entry of the matrix
+    num_nodes = len(graph)
+    if isinstance(graph, SparseGraph):
+        return list(graph.edges())
+    graph = dense_rows(graph)
+    return [
+        (from_node, to_node, graph[from_node][to_node])
+        for from_node in range(num_nodes)
+        for to_node in range(num_nodes)
+        if graph[from_node][to_node] != math.inf
+    ]
+
+
+def choose_all_pairs_engine(graph):
+    # Floyd-Warshall is O(V^3) regardless of edges, Johnson is O(V*E*log V)
+    num_nodes = len(graph)
+    if num_nodes == 0:
+        return "floyd-warshall"
+    density = len(edge_list(graph)) / (num_nodes * num_nodes)
+    if density >= DENSE_THRESHOLD:
+        return "floyd-warshall"
+    return "johnson"
+
+
+def calc_all_pairs(graph, engine="auto"):
+    # Every source in one computation, rows match calc_bellman_ford(source)
+    if engine == "auto":
+        engine = choose_all_pairs_engine(graph)
+    if engine == "floyd-warshall":
+        return calc_floyd_warshall(graph)
+    elif engine == "johnson":
+        return calc_johnson(graph)
+    raise ValueError(f"Unknown all-pairs engine: {engine}")
+
+
+def calc_floyd_warshall(graph):
+    num_nodes = len(graph)
+    dense = graph.to_matrix() if isinstance(graph, SparseGraph) else graph
+    if np is not None:
+        distances = calc_floyd_warshall_numpy(dense)
+    else:
+        distances = calc_floyd_warshall_python(dense)
+
+    # A source whose row is None can reach a node lying on a negative cycle
+    on_cycle = [node for node in range(num_nodes) if distances[node][node] < 0]
+    rows = []
+    for source_node in range(num_nodes):
+        if any(distances[source_node][node] != math.inf for node in on_cycle):
+            rows.append([None] * num_nodes)
+        else:
+            rows.append(to_python_distances(distances[source_node]))
+    return rows
+
+
+def calc_floyd_warshall_python(dense):
+    num_nodes = len(dense)
+    distances = [list(row) for row in dense]
+    for node in range(num_nodes):
+        distances[node][node] = min(distances[node][node], 0)
+
+    for via_node in range(num_nodes):
+        via_row = distances[via_node]
+        for from_node in range(num_nodes):
+            to_via = distances[from_node][via_node]
+            if to_via == math.inf:
+                continue
+            row = distances[from_node]
+            for to_node in range(num_nodes):
+                if to_via + via_row[to_node] < row[to_node]:
+                    row[to_node] = to_via + via_row[to_node]
     return distances
 
 
-def print_bellman_ford(num_nodes, matrix):
+def calc_floyd_warshall_numpy(dense):
+    num_nodes = len(dense)
+    distances = np.array(dense, dtype=np.float64).reshape(num_nodes, num_nodes)
+    np.fill_diagonal(distances, np.minimum(distances.diagonal(), 0))
+
+    # Negative cycles can drive entries to -inf, fmin skips the inf - inf NaNs
+    with np.errstate(invalid="ignore", over="ignore"):
+        for via_node in range(num_nodes):
+            np.fmin(
+                distances,
+                distances[:, via_node, None] + distances[None, via_node, :],
+                out=distances,
+            )
+    return distances.tolist()
+
+
+def calc_johnson(graph):
+    num_nodes = len(graph)
+    edges = edge_list(graph)
+
+    # Potentials from a virtual node joined to every node with weight 0
+    potentials = [0] * num_nodes
+    for iteration in range(num_nodes):
+        changed = False
+        for from_node, to_node, weight in edges:
+            if potentials[from_node] + weight < potentials[to_node]:
+                potentials[to_node] = potentials[from_node] + weight
+                changed = True
+        if not changed:
+            break
+    else:
+        # Still relaxing after V passes, let Floyd-Warshall work out
+        # which sources can reach the negative cycle
+        return calc_floyd_warshall(graph)
+
+    # Reweighted edges are non negative, so Dijkstra works from every source
+    adjacency = [[] for node in range(num_nodes)]
+    for from_node, to_node, weight in edges:
+        adjacency[from_node].append(
+            (to_node, weight + potentials[from_node] - potentials[to_node])
+        )
+
+    rows = []
     for source_node in range(num_nodes):
-        distances = calc_bellman_ford(source_node)
-        print(f"Node {source_node}: {distances}")
+        reweighted = [math.inf] * num_nodes
+        reweighted[source_node] = 0
+        heap = [(0, source_node)]
+        while heap:
+            distance, node = heapq.heappop(heap)
+            if distance > reweighted[node]:
+                continue
+            for to_node, weight in adjacency[node]:
+                if distance + weight < reweighted[to_node]:
+                    reweighted[to_node] = distance + weight
+                    heapq.heappush(heap, (distance + weight, to_node))
+        rows.append(
+            to_python_distances(
+                distance - potentials[source_node] + potentials[node]
+                if distance != math.inf
+                else math.inf
+                for node, distance in enumerate(reweighted)
+            )
+        )
+    return rows
 
 
-if __name__ == "__main__":
-    input_file = sys.stdin.read
+class IncrementalBellmanFord:
+    # Keeps distance and predecessor state for one source and repairs only
+    # the affected part of the shortest path tree when a link weight changes
+    def __init__(self, graph, source_node):
+        self.num_nodes = len(graph)
+        self.source_node = source_node
+        self.out_edges = [{} for node in range(self.num_nodes)]
+        self.in_edges = [{} for node in range(self.num_nodes)]
+        if isinstance(graph, SparseGraph):
+            edges = graph.edges()
+        else:
+            edges = (
+                (from_node, to_node, weight)
+                for from_node, row in enumerate(dense_rows(graph))
+                for to_node, weight in enumerate(row)
+                if weight != math.inf
+            )
+        for from_node, to_node, weight in edges:
+            weight = min(weight, self.out_edges[from_node].get(to_node, math.inf))
+            self.out_edges[from_node][to_node] = weight
+            self.in_edges[to_node][from_node] = weight
+        self.recompute()
 
-    matrix_data = input_file().splitlines()
+    def recompute(self):
+        # Full SPFA from the source, also used to leave the negative cycle state
+        self.node_distances = [math.inf] * self.num_nodes
+        self.predecessors = [-1] * self.num_nodes
+        self.children = [set() for node in range(self.num_nodes)]
+        self.path_lengths = [0] * self.num_nodes
+        self.negative_cycle = False
+        self.node_distances[self.source_node] = 0
+        self.relax_from([self.source_node], {})
 
-    num_nodes = int(matrix_data[0])
+    @property
+    def distances(self):
+        # Same shape as calc_bellman_ford, a reachable negative cycle gives None
+        if self.negative_cycle:
+            return [None] * self.num_nodes
+        return to_python_distances(self.node_distances)
 
-    matrix = []
+    def set_predecessor(self, node, predecessor):
+        if self.predecessors[node] != -1:
+            self.children[self.predecessors[node]].discard(node)
+        self.predecessors[node] = predecessor
+        if predecessor != -1:
+            self.children[predecessor].add(node)
 
-    for row_index in range(num_nodes):
-        matrix.append([])
-        for col_index in range(num_nodes):
-            num_to_insert = matrix_data[1 + row_index * num_nodes + col_index]
-            if num_to_insert == "f":
-                matrix[row_index].append(float("inf"))
+    def relax_from(self, start_nodes, old_distances):
+        # SPFA from the given nodes, old_distances records the first value
+        # of every node touched so the changed destinations can be reported
+        queue = deque(start_nodes)
+        in_queue = set(start_nodes)
+        while queue:
+            from_node = queue.popleft()
+            in_queue.discard(from_node)
+            from_distance = self.node_distances[from_node]
+            for to_node, weight in self.out_edges[from_node].items():
+                if from_distance + weight < self.node_distances[to_node]:
+                    old_distances.setdefault(to_node, self.node_distances[to_node])
+                    self.node_distances[to_node] = from_distance + weight
+                    self.set_predecessor(to_node, from_node)
+                    self.path_lengths[to_node] = self.path_lengths[from_node] + 1
+                    if self.path_lengths[to_node] >= self.num_nodes:
+                        self.negative_cycle = True
+                        return
+                    if to_node not in in_queue:
+                        in_queue.add(to_node)
+                        queue.append(to_node)
+
+    def update_edge(self, from_node, to_node, weight):
+        # Add or reweight the link from_node -> to_node, returns the
+        # destinations whose distance changed
+        old_weight = self.out_edges[from_node].get(to_node, math.inf)
+        self.out_edges[from_node][to_node] = weight
+        self.in_edges[to_node][from_node] = weight
+        if weight < old_weight:
+            return self.apply_decrease(from_node, to_node)
+        return self.apply_increase(from_node, to_node)
+
+    def remove_edge(self, from_node, to_node):
+        if to_node not in self.out_edges[from_node]:
+            return []
+        del self.out_edges[from_node][to_node]
+        del self.in_edges[to_node][from_node]
+        return self.apply_increase(from_node, to_node)
+
+    def apply_decrease(self, from_node, to_node):
+        if self.negative_cycle:
+            return self.apply_recompute()
+        old_distances = {}
+        weight = self.out_edges[from_node][to_node]
+        if self.node_distances[from_node] + weight < self.node_distances[to_node]:
+            old_distances[to_node] = self.node_distances[to_node]
+            self.node_distances[to_node] = self.node_distances[from_node] + weight
+            self.set_predecessor(to_node, from_node)
+            self.path_lengths[to_node] = self.path_lengths[from_node] + 1
+            if self.path_lengths[to_node] >= self.num_nodes:
+                self.negative_cycle = True
             else:
-                matrix[row_index].append(int(num_to_insert))
+                self.relax_from([to_node], old_distances)
+        if self.negative_cycle:
+            return list(range(self.num_nodes))
+        return self.changed_nodes(old_distances)
+
+    def apply_increase(self, from_node, to_node):
+        if self.negative_cycle:
+            return self.apply_recompute()
+        # Only a link on the shortest path tree can make distances worse
+        if self.predecessors[to_node] != from_node:
+            return []
+
+        # Every node below to_node in the tree loses its route
+        affected = [to_node]
+        for node in affected:
+            affected.extend(self.children[node])
+        old_distances = {}
+        for node in affected:
+            old_distances[node] = self.node_distances[node]
+            self.node_distances[node] = math.inf
+            self.set_predecessor(node, -1)
+
+        # Reattach each affected node through its best unaffected neighbour,
+        # then let the improvements spread through the affected region
+        affected_set = set(affected)
+        start_nodes = []
+        for node in affected:
+            for neighbour, weight in self.in_edges[node].items():
+                if neighbour in affected_set:
+                    continue
+                if self.node_distances[neighbour] + weight < self.node_distances[node]:
+                    self.node_distances[node] = self.node_distances[neighbour] + weight
+                    self.set_predecessor(node, neighbour)
+                    self.path_lengths[node] = self.path_lengths[neighbour] + 1
+            if self.node_distances[node] != math.inf:
+                start_nodes.append(node)
+        self.relax_from(start_nodes, old_distances)
+        return self.changed_nodes(old_distances)
+
+    def apply_recompute(self):
+        old_distances = self.distances
+        self.recompute()
+        return [
+            node
+            for node, distance in enumerate(self.distances)
+            if distance != old_distances[node]
+        ]
+
+    def changed_nodes(self, old_distances):
+        return sorted(
+            node
+            for node, distance in old_distances.items()
+            if self.node_distances[node] != distance
+        )
+
+
+def graph_arrays(graph):
+    # Flat arrays and layout of a graph, the packed form that attach_graph reads
+    num_nodes = len(graph)
+    if isinstance(graph, SparseGraph):
+        arrays = [
+            array("q", graph.offsets),
+            array("q", graph.targets),
+            array("d", graph.weights),
+        ]
+        return arrays, ("sparse", num_nodes, graph.num_edges)
+    return [array("d", (weight for row in graph for weight in row))], (
+        "dense",
+        num_nodes,
+        0,
+    )
+
+
+def share_graph(graph):
+    # Copy the graph into one shared memory block so pool workers map it
+    # instead of each receiving a pickled copy
+    arrays, layout = graph_arrays(graph)
+    size = sum(len(values) * values.itemsize for values in arrays)
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    position = 0
+    for values in arrays:
+        data = values.tobytes()
+        shm.buf[position : position + len(data)] = data
+        position += len(data)
+    return shm, layout
+
+
+def attach_graph(buffer, layout):
+    # Zero copy view of a graph written by share_graph or save_graph_cache
+    kind, num_nodes, num_edges = layout
+    if kind == "sparse":
+        offsets_end = 8 * (num_nodes + 1)
+        targets_end = offsets_end + 8 * num_edges
+        return SparseGraph(
+            num_nodes,
+            buffer[:offsets_end].cast("q"),
+            buffer[offsets_end:targets_end].cast("q"),
+            buffer[targets_end : targets_end + 8 * num_edges].cast("d"),
+        )
+
+    weights = buffer[: 8 * num_nodes * num_nodes].cast("d")
+    if np is not None:
+        return np.frombuffer(weights, dtype=np.float64).reshape(num_nodes, num_nodes)
+    return [
+        weights[row * num_nodes : (row + 1) * num_nodes] for row in range(num_nodes)
+    ]
+
+
+# Binary cache header: magic, layout kind, input format, node and edge
+# counts, then the size and mtime of the text file it was parsed from
+CACHE_MAGIC = b"BFGRAPH1"
+CACHE_HEADER = struct.Struct("<8sBBxxxxxxqqqq")
+CACHE_KINDS = ("dense", "sparse")
+
+
+def save_graph_cache(graph, cache_path, source_stat, input_format):
+    arrays, (kind, num_nodes, num_edges) = graph_arrays(graph)
+    header = CACHE_HEADER.pack(
+        CACHE_MAGIC,
+        CACHE_KINDS.index(kind),
+        FORMATS.index(input_format),
+        num_nodes,
+        num_edges,
+        source_stat.st_size,
+        source_stat.st_mtime_ns,
+    )
+    # Write next to the cache and rename so a reader never sees half a file
+    temp_path = f"{cache_path}.tmp{os.getpid()}"
+    with open(temp_path, "wb") as file:
+        file.write(header)
+        for values in arrays:
+            values.tofile(file)
+    os.replace(temp_path, cache_path)
+
+
+def load_graph_cache(cache_path, source_stat, input_format):
+    # Memory map the cache and return a zero copy graph, None when the cache
+    # is missing or was built from a different version of the text
+    try:
+        with open(cache_path, "rb") as file:
+            if os.fstat(file.fileno()).st_size < CACHE_HEADER.size:
+                return None
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        return None
+
+    magic, kind, file_format, num_nodes, num_edges, size, mtime_ns = (
+        CACHE_HEADER.unpack_from(mapped)
+    )
+    if (
+        magic != CACHE_MAGIC
+        or file_format != FORMATS.index(input_format)
+        or size != source_stat.st_size
+        or mtime_ns != source_stat.st_mtime_ns
+    ):
+        mapped.close()
+        return None
+    return attach_graph(
+        memoryview(mapped)[CACHE_HEADER.size :],
+        (CACHE_KINDS[kind], num_nodes, num_edges),
+    )
+
+
+def load_graph(input_path, input_format="matrix", cache_path=None):
+    # Parse a graph file, going through the binary cache when one is given.
+    # The cache is rebuilt whenever the text file's size or mtime changes
+    source_stat = os.stat(input_path)
+    if cache_path is not None:
+        graph = load_graph_cache(cache_path, source_stat, input_format)
+        if graph is not None:
+            return graph
+
+    with open(input_path) as file:
+        if input_format == "edges":
+            graph = read_edge_list(file)
+        else:
+            graph = read_matrix(file.read().splitlines())
+
+    if cache_path is not None:
+        save_graph_cache(graph, cache_path, source_stat, input_format)
+    return graph
+
+
+# Per process state of a pool worker, filled in by init_worker
+worker_state = {}
+
+
+def init_worker(shm_name, layout, engine, early_exit):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    worker_state["shm"] = shm
+    worker_state["graph"] = attach_graph(shm.buf, layout)
+    worker_state["engine"] = engine
+    worker_state["early_exit"] = early_exit
+
+
+def run_worker(source_node):
+    return calc_bellman_ford(
+        worker_state["graph"],
+        source_node,
+        worker_state["engine"],
+        worker_state["early_exit"],
+    )
+
+
+def calc_all_sources(graph, engine="python", early_exit=False, workers=1):
+    # Distances from every source in source order, spread over a process
+    # pool that shares the graph when workers > 1
+    num_nodes = len(graph)
+    if workers <= 1:
+        for source_node in range(num_nodes):
+            yield calc_bellman_ford(graph, source_node, engine, early_exit)
+        return
+
+    shm, layout = share_graph(graph)
+    try:
+        with multiprocessing.Pool(
+            workers,
+            initializer=init_worker,
+            initargs=(shm.name, layout, engine, early_exit),
+        ) as pool:
+            chunksize = max(1, num_nodes // (workers * 4))
+            yield from pool.imap(run_worker, range(num_nodes), chunksize)
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def print_bellman_ford(
+    num_nodes,
+    matrix,
+    engine="python",
+    all_pairs=None,
+    early_exit=False,
+    workers=1,
+):
+    # all_pairs names an all-pairs engine, otherwise each source runs separately
+    if all_pairs is not None:
+        rows = calc_all_pairs(matrix, all_pairs)
+    else:
+        rows = calc_all_sources(matrix, engine, early_exit, workers)
+
+    # Cycles named so far, a source that reaches one of them reuses it instead of
+    # running Bellman-Ford again just to find it
+    cycles = []
+    adjacency = None
+    for source_node, distances in enumerate(rows):
+        if distances and distances[0] is None:
+            # Name the nodes on the cycle rather than printing a row of None
+            if adjacency is None:
+                adjacency = out_edge_lists(matrix)
+            reachable = reachable_nodes(adjacency, source_node)
+            cycle = next((cycle for cycle in cycles if cycle[0] in reachable), None)
+            if cycle is None:
+                cycle = calc_shortest_paths(matrix, source_node, engine).negative_cycle
+                if cycle is not None:
+                    cycles.append(cycle)
+            print(f"Node {source_node}: negative cycle {cycle}")
+        else:
+            print(f"Node {source_node}: {distances}")
+
+
+def print_path(graph, source_node, dest_node, engine="python", early_exit=False):
+    result = calc_shortest_paths(graph, source_node, engine, early_exit)
+    if result.negative_cycle is not None:
+        print(f"Node {source_node}: negative cycle {result.negative_cycle}")
+        return
+    path = result.path_to(dest_node)
+    if path is None:
+        print(f"Path {source_node} -> {dest_node}: unreachable")
+    else:
+        distance = result.distances[dest_node]
+        print(f"Path {source_node} -> {dest_node}: {path} (distance {distance})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bellman-Ford shortest paths")
+    parser.add_argument(
+        "input",
+        nargs="?",
+        help="graph file, stdin is read when it is left out",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default="python",
+        help="relaxation engine, python is the reference loop and spfa is queue based",
+    )
+    parser.add_argument(
+        "--early-exit",
+        action="store_true",
+        help="stop relaxing once a pass changes no distance",
+    )
+    parser.add_argument(
+        "--all-pairs",
+        nargs="?",
+        const="auto",
+        choices=ALL_PAIRS_ENGINES,
+        help="compute every source at once, the engine is picked by edge density by default",
+    )
+    parser.add_argument(
+        "--format",
+        choices=FORMATS,
+        default="matrix",
+        help='input format, "edges" streams "src dst weight" lines into a sparse graph',
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of processes sharing the sources, the graph is in shared memory",
+    )
+    parser.add_argument(
+        "--path",
+        type=int,
+        nargs=2,
+        metavar=("SOURCE", "DEST"),
+        help="print the route between two nodes instead of every distance",
+    )
+    parser.add_argument(
+        "--cache",
+        nargs="?",
+        const="",
+        help="keep a binary copy of the parsed graph (default INPUT.bfcache) and "
+        "load it instead of the text while the input is unchanged",
+    )
+    args = parser.parse_args()
+
+    if args.input is not None:
+        cache_path = args.cache or (
+            f"{args.input}.bfcache" if args.cache is not None else None
+        )
+        graph = load_graph(args.input, args.format, cache_path)
+    elif args.cache is not None:
+        parser.error("--cache needs an input file")
+    elif args.format == "edges":
+        graph = read_edge_list(sys.stdin)
+    else:
+        graph = read_matrix(sys.stdin.read().splitlines())
+
+    if args.path is not None:
+        print_path(graph, *args.path, args.engine, args.early_exit)
+        sys.exit()
 
-    print_bellman_ford(num_nodes, matrix)
+    print_bellman_ford(
+        len(graph),
+        graph,
+        args.engine,
+        args.all_pairs,
+        args.early_exit,
+        args.workers,
+    )
@@ -0,0 +1,219 @@
+#Elizabeth Dorfman
+#Benchmark comparing the Bellman-Ford engines on random dense graphs.
+
+import argparse
+import math
+import os
+import random
+import tempfile
+import time
+
+import bellmanford
+
+
+def random_matrix(num_nodes, density, seed=0):
+    # Random directed graph with non negative integer weights
+    rng = random.Random(seed)
+    matrix = []
+    for from_node in range(num_nodes):
+        row = []
+        for to_node in range(num_nodes):
+            if from_node == to_node:
+                row.append(0)
+            elif rng.random() < density:
+                row.append(rng.randint(1, 20))
+            else:
+                row.append(math.inf)
+        matrix.append(row)
+    return matrix
+
+
+def random_sparse_graph(num_nodes, degree, seed=0):
+    # Random directed graph with about degree out edges per node
+    rng = random.Random(seed)
+    sources, targets, weights = [], [], []
+    for from_node in range(num_nodes):
+        for edge in range(degree):
+            sources.append(from_node)
+            targets.append(rng.randrange(num_nodes))
+            weights.append(rng.randint(1, 20))
+    return bellmanford.SparseGraph.from_edges(num_nodes, sources, targets, weights)
+
+
+def time_engine(graph, engine, source_node, repeats, early_exit=False):
+    best = math.inf
+    for i in range(repeats):
+        start = time.perf_counter()
+        distances = bellmanford.calc_bellman_ford(graph, source_node, engine, early_exit)
+        best = min(best, time.perf_counter() - start)
+    return best, distances
+
+
+def benchmark_engines(sizes, density, repeats):
+    for num_nodes in sizes:
+        matrix = random_matrix(num_nodes, density)
+
+        python_time, expected = time_engine(matrix, "python", 0, repeats)
+        numpy_time, distances = time_engine(matrix, "numpy", 0, repeats)
+        if distances != expected:
+            print(f"V={num_nodes}: engines disagree!")
+
+        print(
+            f"V={num_nodes}: python {python_time * 1000:.1f} ms, "
+            f"numpy {numpy_time * 1000:.1f} ms, "
+            f"speedup {python_time / numpy_time:.1f}x"
+        )
+
+
+def benchmark_all_pairs(sizes, density):
+    for num_nodes in sizes:
+        matrix = random_matrix(num_nodes, density)
+
+        start = time.perf_counter()
+        expected = [
+            bellmanford.calc_bellman_ford(matrix, source_node, "numpy")
+            for source_node in range(num_nodes)
+        ]
+        results = [
+            f"V={num_nodes}: per-source numpy "
+            f"{(time.perf_counter() - start) * 1000:.1f} ms"
+        ]
+        for engine in ("floyd-warshall", "johnson"):
+            start = time.perf_counter()
+            rows = bellmanford.calc_all_pairs(matrix, engine)
+            results.append(f"{engine} {(time.perf_counter() - start) * 1000:.1f} ms")
+            if rows != expected:
+                print(f"V={num_nodes}: {engine} disagrees with per-source runs!")
+        auto_engine = bellmanford.choose_all_pairs_engine(matrix)
+        print(", ".join(results) + f" (auto picks {auto_engine})")
+
+
+def benchmark_convergence(sizes, density, degree, repeats):
+    # Full V-1 passes against early exit and SPFA on dense and sparse inputs
+    modes = [
+        ("python", False),
+        ("python", True),
+        ("numpy", False),
+        ("numpy", True),
+        ("spfa", False),
+    ]
+    for num_nodes in sizes:
+        inputs = [
+            ("dense", random_matrix(num_nodes, density)),
+            ("sparse", random_sparse_graph(num_nodes, degree)),
+        ]
+        for name, graph in inputs:
+            results = []
+            expected = None
+            for engine, early_exit in modes:
+                elapsed, distances = time_engine(graph, engine, 0, repeats, early_exit)
+                if expected is None:
+                    expected = distances
+                elif distances != expected:
+                    print(f"V={num_nodes} {name}: {engine} disagrees!")
+                label = engine + (" early-exit" if early_exit else "")
+                results.append(f"{label} {elapsed * 1000:.1f} ms")
+            print(f"V={num_nodes} {name}: " + ", ".join(results))
+
+
+def benchmark_workers(sizes, density, degree, engine, worker_counts):
+    # Every source on a dense and a sparse graph, one process against a shared memory pool
+    for num_nodes in sizes:
+        inputs = [
+            ("dense", random_matrix(num_nodes, density)),
+            ("sparse", random_sparse_graph(num_nodes, degree)),
+        ]
+        for name, graph in inputs:
+            results = []
+            expected = None
+            for workers in worker_counts:
+                start = time.perf_counter()
+                rows = list(bellmanford.calc_all_sources(graph, engine, True, workers))
+                results.append(f"{workers} workers {(time.perf_counter() - start) * 1000:.1f} ms")
+                if expected is None:
+                    expected = rows
+                elif rows != expected:
+                    print(f"V={num_nodes} {name}: {workers} workers disagree!")
+            print(f"V={num_nodes} {name} {engine}: " + ", ".join(results))
+
+
+def write_matrix(path, matrix):
+    # The text format read_matrix parses, one cell per line and "f" for no edge
+    with open(path, "w") as file:
+        file.write(f"{len(matrix)}\n")
+        for row in matrix:
+            for weight in row:
+                file.write("f\n" if weight == math.inf else f"{weight}\n")
+
+
+def benchmark_cache(sizes, density, num_sources, engines):
+    # Load and a few sources from the text file against the same from the binary cache,
+    # the cached graph has to be at least as fast to be worth keeping
+    for num_nodes in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            input_path = os.path.join(directory, "matrix.txt")
+            cache_path = input_path + ".bfcache"
+            write_matrix(input_path, random_matrix(num_nodes, density))
+            # Builds the cache so every timed cache load is a hit
+            bellmanford.load_graph(input_path, "matrix", cache_path)
+            for engine in engines:
+                results = []
+                for path in (None, cache_path):
+                    start = time.perf_counter()
+                    graph = bellmanford.load_graph(input_path, "matrix", path)
+                    rows = [
+                        bellmanford.calc_bellman_ford(graph, source_node, engine)
+                        for source_node in range(num_sources)
+                    ]
+                    results.append((time.perf_counter() - start, rows))
+                (text_time, expected), (cache_time, rows) = results
+                if rows != expected:
+                    print(f"V={num_nodes} {engine}: cache disagrees with text!")
+                if cache_time > text_time:
+                    print(f"V={num_nodes} {engine}: cache slower than text!")
+                print(
+                    f"V={num_nodes} {engine}: text {text_time * 1000:.1f} ms, "
+                    f"cache {cache_time * 1000:.1f} ms"
+                )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Bellman-Ford engines")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 100, 200])
+    parser.add_argument("--density", type=float, default=0.3)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--degree", type=int, default=4)
+    parser.add_argument(
+        "--convergence",
+        action="store_true",
+        help="compare full passes against early exit and SPFA",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        nargs="+",
+        help="compare all-sources runs with these process pool sizes",
+    )
+    parser.add_argument(
+        "--all-pairs",
+        action="store_true",
+        help="compare one run per source against the all-pairs engines",
+    )
+    parser.add_argument(
+        "--cache",
+        type=int,
+        metavar="SOURCES",
+        help="compare loading the text against the binary cache, then running this many sources",
+    )
+    args = parser.parse_args()
+
+    if args.cache:
+        benchmark_cache(args.sizes, args.density, args.cache, bellmanford.ENGINES)
+    elif args.all_pairs:
+        benchmark_all_pairs(args.sizes, args.density)
+    elif args.workers:
+        benchmark_workers(args.sizes, args.density, args.degree, "spfa", args.workers)
+    elif args.convergence:
+        benchmark_convergence(args.sizes, args.density, args.degree, args.repeats)
+    else:
+        benchmark_engines(args.sizes, args.density, args.repeats)
@@ -0,0 +1,372 @@
+#Elizabeth Dorfman
+#Simulation of a distributed distance-vector routing protocol built on the Bellman-Ford update rule.
+
+import argparse
+import asyncio
+import math
+import random
+import sys
+import time
+
+from bellmanford import SparseGraph, calc_bellman_ford, read_edge_list
+
+# RIP style infinity, a route costing this much or more is unreachable
+DEFAULT_INFINITY = 16
+
+
+class DistanceVectorNode:
+    # One router, it owns its links, the last vector heard from each
+    # neighbour and its own routing table, and only talks through its inbox
+    def __init__(self, node_id, simulation):
+        self.node_id = node_id
+        self.simulation = simulation
+        self.inbox = asyncio.Queue()
+        # Outgoing links {neighbour: cost}, routes are learned through these
+        self.links = {}
+        # Nodes with a link to this one, they receive this node's vector
+        self.listeners = set()
+        # Last cost heard from each neighbour {neighbour: {dest: cost}}
+        self.tables = {}
+        # Routing table {dest: (cost, next_hop)}
+        self.routes = {node_id: (0, node_id)}
+
+    async def run(self):
+        while True:
+            # Drain everything already queued and recompute once, so a burst
+            # of updates turns into a single triggered update per listener
+            messages = [await self.inbox.get()]
+            while not self.inbox.empty():
+                messages.append(self.inbox.get_nowait())
+            dests = set()
+            for kind, sender, payload in messages:
+                if kind == "update":
+                    dests.update(self.receive_update(sender, payload))
+                elif kind == "fail":
+                    dests.update(self.fail_link(sender))
+            self.recompute(dests)
+            for message in messages:
+                self.simulation.message_done()
+
+    def advertised_cost(self, route, listener):
+        # What this node tells one listener about a route. Split horizon
+        # withdraws (None) routes learned from that listener, poisoned
+        # reverse advertises them as unreachable instead
+        cost, next_hop = route
+        if next_hop == listener and next_hop != self.node_id:
+            if self.simulation.poisoned_reverse:
+                return self.simulation.infinity
+            if self.simulation.split_horizon:
+                return None
+        if cost == math.inf:
+            return self.simulation.infinity
+        return cost
+
+    def announce(self, changes):
+        # changes is {dest: old_route}, send each listener only the entries
+        # whose advertised value actually changed for it
+        for listener in self.listeners:
+            update = {}
+            for dest, old_route in changes.items():
+                new_value = self.advertised_cost(self.routes[dest], listener)
+                if old_route is None or new_value != self.advertised_cost(
+                    old_route, listener
+                ):
+                    update[dest] = new_value
+            if update:
+                self.simulation.send(listener, ("update", self.node_id, update))
+
+    def receive_update(self, sender, update):
+        # Store the neighbour's new costs, returns the destinations to recompute
+        if sender not in self.links:
+            return []
+        table = self.tables.setdefault(sender, {})
+        for dest, cost in update.items():
+            if cost is None:
+                table.pop(dest, None)
+            else:
+                table[dest] = cost
+        return update.keys()
+
+    def fail_link(self, neighbour):
+        self.links.pop(neighbour, None)
+        self.listeners.discard(neighbour)
+        lost = self.tables.pop(neighbour, {})
+        return [
+            dest for dest, route in self.routes.items() if route[1] == neighbour
+        ] + list(lost)
+
+    def recompute(self, dests):
+        # Bellman-Ford update: cost(dest) = min over links of cost(link) + cost(neighbour, dest)
+        infinity = self.simulation.infinity
+        changes = {}
+        for dest in dests:
+            if dest == self.node_id:
+                continue
+            old_route = self.routes.get(dest)
+            best_cost, best_hop = math.inf, None
+            if old_route is not None and old_route[1] in self.links:
+                # Keep the current next hop on ties so routes do not flap
+                best_hop = old_route[1]
+                best_cost = self.links[best_hop] + self.tables.get(best_hop, {}).get(
+                    dest, math.inf
+                )
+            for neighbour, link_cost in self.links.items():
+                cost = link_cost + self.tables.get(neighbour, {}).get(dest, math.inf)
+                if cost < best_cost:
+                    best_cost, best_hop = cost, neighbour
+            if best_cost >= infinity:
+                best_cost, best_hop = math.inf, None
+            new_route = (best_cost, best_hop)
+            if old_route is None and best_cost == math.inf:
+                continue
+            if new_route != old_route:
+                self.routes[dest] = new_route
+                changes[dest] = old_route
+                self.simulation.record_change(self.node_id, dest, old_route, new_route)
+        if changes:
+            self.announce(changes)
+
+
+class DistanceVectorSimulation:
+    # Runs one actor per node over in-process asyncio queues and measures how
+    # the vectors converge, initially and after each link failure
+    def __init__(
+        self,
+        graph,
+        split_horizon=False,
+        poisoned_reverse=False,
+        infinity=DEFAULT_INFINITY,
+    ):
+        self.graph = graph
+        self.split_horizon = split_horizon
+        self.poisoned_reverse = poisoned_reverse
+        self.infinity = infinity
+        self.nodes = []
+        self.pending = 0
+        self.idle = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.messages = 0
+        self.entries = 0
+        self.route_changes = 0
+        # Successive cost increases per (node, dest), a long run of small
+        # increases is the count-to-infinity problem
+        self.increases = {}
+
+    def send(self, node_id, message):
+        self.pending += 1
+        self.messages += 1
+        if message[0] == "update":
+            self.entries += len(message[2])
+        self.idle.clear()
+        self.nodes[node_id].inbox.put_nowait(message)
+
+    def message_done(self):
+        self.pending -= 1
+        if self.pending == 0:
+            self.idle.set()
+
+    def record_change(self, node_id, dest, old_route, new_route):
+        self.route_changes += 1
+        if old_route is not None and new_route[0] > old_route[0]:
+            self.increases[node_id, dest] = self.increases.get((node_id, dest), 0) + 1
+
+    async def start(self):
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.nodes = [DistanceVectorNode(node, self) for node in range(len(self.graph))]
+        if isinstance(self.graph, SparseGraph):
+            edges = self.graph.edges()
+        else:
+            edges = (
+                (from_node, to_node, weight)
+                for from_node, row in enumerate(self.graph)
+                for to_node, weight in enumerate(row)
+                if weight != math.inf
+            )
+        for from_node, to_node, weight in edges:
+            if from_node == to_node:
+                continue
+            if weight <= 0:
+                raise ValueError("Distance-vector routing needs positive link costs")
+            self.nodes[from_node].links[to_node] = min(
+                weight, self.nodes[from_node].links.get(to_node, math.inf)
+            )
+            self.nodes[to_node].listeners.add(from_node)
+        self.tasks = [asyncio.create_task(node.run()) for node in self.nodes]
+
+        # Every node starts by advertising the route to itself
+        for node in self.nodes:
+            node.announce({node.node_id: None})
+        return await self.converge("initial")
+
+    async def converge(self, phase):
+        start = time.perf_counter()
+        await self.idle.wait()
+        report = {
+            "phase": phase,
+            "convergence_time": time.perf_counter() - start,
+            "messages": self.messages,
+            "route_entries": self.entries,
+            "route_changes": self.route_changes,
+            "max_increases": max(self.increases.values(), default=0),
+            "counted_to_infinity": sum(
+                1
+                for (node_id, dest), count in self.increases.items()
+                if count > 1 and self.nodes[node_id].routes[dest][0] == math.inf
+            ),
+        }
+        self.reset_stats()
+        return report
+
+    async def fail_link(self, from_node, to_node):
+        # Both directions go down together, like a cut cable
+        self.reset_stats()
+        start_phase = f"fail {from_node}-{to_node}"
+        self.send(from_node, ("fail", to_node, None))
+        self.send(to_node, ("fail", from_node, None))
+        return await self.converge(start_phase)
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    def distance_table(self):
+        # Converged costs per node in the same shape as calc_bellman_ford
+        tables = []
+        for node in self.nodes:
+            row = [math.inf] * len(self.nodes)
+            for dest, (cost, next_hop) in node.routes.items():
+                row[dest] = cost
+            tables.append(row)
+        return tables
+
+    def matches_bellman_ford(self, graph):
+        # Compare against the centralised solver, capped at infinity
+        for node_id, row in enumerate(self.distance_table()):
+            expected = calc_bellman_ford(graph, node_id, "spfa")
+            expected = [cost if cost < self.infinity else math.inf for cost in expected]
+            if row != expected:
+                return False
+        return True
+
+
+def random_network(num_nodes, degree, max_cost, seed=0):
+    # Connected random network of bidirectional links: a ring plus random chords
+    rng = random.Random(seed)
+    links = {}
+    for node in range(num_nodes):
+        links[node, (node + 1) % num_nodes] = rng.randint(1, max_cost)
+    while len(links) < num_nodes * degree // 2:
+        from_node, to_node = rng.randrange(num_nodes), rng.randrange(num_nodes)
+        if from_node != to_node and (to_node, from_node) not in links:
+            links[from_node, to_node] = rng.randint(1, max_cost)
+    sources, targets, weights = [], [], []
+    for (from_node, to_node), cost in links.items():
+        sources += [from_node, to_node]
+        targets += [to_node, from_node]
+        weights += [cost, cost]
+    return SparseGraph.from_edges(num_nodes, sources, targets, weights)
+
+
+def without_link(graph, from_node, to_node):
+    # Copy of a sparse graph with the link removed in both directions
+    sources, targets, weights = [], [], []
+    for source, target, weight in graph.edges():
+        if {source, target} != {from_node, to_node}:
+            sources.append(source)
+            targets.append(target)
+            weights.append(weight)
+    return SparseGraph.from_edges(len(graph), sources, targets, weights)
+
+
+async def simulate(
+    graph, failures, split_horizon, poisoned_reverse, infinity, verify=False
+):
+    # Initial convergence then one phase per failed link, verify compares
+    # every phase with the centralised solver
+    simulation = DistanceVectorSimulation(
+        graph, split_horizon, poisoned_reverse, infinity
+    )
+    reports = [await simulation.start()]
+    for from_node, to_node in failures:
+        if verify:
+            reports[-1]["correct"] = simulation.matches_bellman_ford(graph)
+        graph = without_link(graph, from_node, to_node)
+        reports.append(await simulation.fail_link(from_node, to_node))
+    if verify:
+        reports[-1]["correct"] = simulation.matches_bellman_ford(graph)
+    await simulation.stop()
+    return reports
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distance-vector routing simulator")
+    parser.add_argument(
+        "--nodes",
+        type=int,
+        help="generate a random network with this many nodes instead of reading stdin edges",
+    )
+    parser.add_argument("--degree", type=int, default=4)
+    parser.add_argument("--max-cost", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--fail",
+        type=int,
+        nargs=2,
+        action="append",
+        default=[],
+        metavar=("U", "V"),
+        help="take the link U-V down after convergence, can be repeated",
+    )
+    parser.add_argument(
+        "--random-failures",
+        type=int,
+        default=0,
+        help="take this many random links down, one after another",
+    )
+    parser.add_argument("--split-horizon", action="store_true")
+    parser.add_argument("--poisoned-reverse", action="store_true")
+    parser.add_argument("--infinity", type=int, default=DEFAULT_INFINITY)
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="check every phase against the centralised Bellman-Ford solver",
+    )
+    args = parser.parse_args()
+
+    if args.nodes:
+        graph = random_network(args.nodes, args.degree, args.max_cost, args.seed)
+    else:
+        graph = read_edge_list(sys.stdin)
+
+    failures = [tuple(link) for link in args.fail]
+    rng = random.Random(args.seed)
+    links = [(source, target) for source, target, weight in graph.edges() if source < target]
+    failures += rng.sample(links, min(args.random_failures, len(links)))
+
+    reports = asyncio.run(
+        simulate(
+            graph,
+            failures,
+            args.split_horizon,
+            args.poisoned_reverse,
+            args.infinity,
+            args.verify,
+        )
+    )
+    for report in reports:
+        print(
+            f"{report['phase']}: converged in {report['convergence_time'] * 1000:.1f} ms, "
+            f"{report['messages']} messages ({report['route_entries']} route entries), "
+            f"{report['route_changes']} route changes, "
+            f"longest count up {report['max_increases']}, "
+            f"{report['counted_to_infinity']} routes counted to infinity"
+            + (
+                f", {'matches' if report['correct'] else 'DIFFERS FROM'} Bellman-Ford"
+                if "correct" in report
+                else ""
+            )
+        )
@@ -0,0 +1,157 @@
+#Elizabeth Dorfman
+#Tests the Bellman-Ford engines against the reference loop.
+
+import asyncio
+import math
+import os
+import random
+import tempfile
+from distance_vector import random_network, simulate
+from bellmanford import load_graph, calc_bellman_ford, calc_shortest_paths, calc_all_pairs, calc_all_sources, read_edge_list, SparseGraph, IncrementalBellmanFord
+
+inf = math.inf
+chain = [[0, 1, 4, inf], [inf, 0, 2, inf], [inf, inf, 0, 3], [inf, inf, inf, 0]]
+negative_cycle = [[0, 1, inf, inf], [inf, 0, -2, inf], [inf, 1, 0, inf], [inf, inf, inf, 0]]
+
+def every_source(graph, engine="python", early_exit=False):
+    return [calc_bellman_ford(graph, source, engine, early_exit) for source in range(len(graph))]
+
+def test_1():# Test 1: Reference loop on a simple chain
+    cond = calc_bellman_ford(chain, 0) == [0, 1, 3, 6]
+    if cond:print("Test 1 passed")
+    else:print("Test 1 failed")
+
+def test_2():# Test 2: NumPy engine matches the reference loop
+    cond = every_source(chain, "numpy") == every_source(chain)
+    if cond:print("Test 2 passed")
+    else:print("Test 2 failed")
+
+def test_3():# Test 3: Negative cycle gives a row of None, unreachable cycle does not
+    cond = calc_bellman_ford(negative_cycle, 0, "numpy") == [None] * 4 and calc_bellman_ford(negative_cycle, 3, "numpy") == [inf, inf, inf, 0]
+    if cond:print("Test 3 passed")
+    else:print("Test 3 failed")
+
+def test_4():# Test 4: Both all-pairs engines match one Bellman-Ford run per source
+    cond = True
+    for matrix in (chain, negative_cycle):
+        expected = every_source(matrix)
+        cond = cond and calc_all_pairs(matrix, "floyd-warshall") == expected and calc_all_pairs(matrix, "johnson") == expected
+    if cond:print("Test 4 passed")
+    else:print("Test 4 failed")
+
+def test_5():# Test 5: Sparse graph read from an edge list matches the dense matrix
+    cond = True
+    for matrix in (chain, negative_cycle):
+        expected = every_source(matrix)
+        graph = SparseGraph.from_matrix(matrix)
+        for engine in ("python", "numpy"):
+            cond = cond and every_source(graph, engine) == expected
+        cond = cond and calc_all_pairs(graph) == expected
+    graph = read_edge_list(["4", "0 1 1", "# comment", "0 2 4", "1 2 2", "", "2 3 3"])
+    cond = cond and graph.num_edges == 4 and graph.to_matrix() == [[inf, 1, 4, inf], [inf, inf, 2, inf], [inf, inf, inf, 3], [inf] * 4]
+    if cond:print("Test 5 passed")
+    else:print("Test 5 failed")
+
+def test_6():# Test 6: Early exit and SPFA match the full passes, including negative cycles
+    rng = random.Random(6)
+    graphs = [chain, negative_cycle]
+    for trial in range(20):
+        size = rng.randint(1, 8)
+        graphs.append([[rng.randint(-2, 9) if rng.random() < 0.4 else inf for col in range(size)] for row in range(size)])
+    cond = True
+    for matrix in graphs:
+        expected = every_source(matrix)
+        for graph in (matrix, SparseGraph.from_matrix(matrix)):
+            for engine in ("python", "numpy"):
+                cond = cond and every_source(graph, engine, True) == expected
+            cond = cond and every_source(graph, "spfa") == expected
+    if cond:print("Test 6 passed")
+    else:print("Test 6 failed")
+
+def test_7():# Test 7: Incremental updates match a full recompute and report the changed nodes
+    rng = random.Random(7)
+    cond = True
+    for trial in range(30):
+        size = rng.randint(2, 8)
+        matrix = [[rng.randint(0, 9) if rng.random() < 0.4 else inf for col in range(size)] for row in range(size)]
+        routes = IncrementalBellmanFord(matrix, 0)
+        for update in range(10):
+            from_node, to_node = rng.randrange(size), rng.randrange(size)
+            before = routes.distances
+            if rng.random() < 0.3:
+                matrix[from_node][to_node] = inf
+                changed = routes.remove_edge(from_node, to_node)
+            else:
+                matrix[from_node][to_node] = rng.randint(-3, 9)
+                changed = routes.update_edge(from_node, to_node, matrix[from_node][to_node])
+            expected = calc_bellman_ford(matrix, 0)
+            cond = cond and routes.distances == expected
+            cond = cond and changed == [node for node in range(size) if before[node] != expected[node]]
+    if cond:print("Test 7 passed")
+    else:print("Test 7 failed")
+
+def test_8():# Test 8: Worker pool returns every source in order, dense and sparse
+    cond = True
+    for matrix in (chain, negative_cycle):
+        expected = every_source(matrix)
+        for graph in (matrix, SparseGraph.from_matrix(matrix)):
+            cond = cond and list(calc_all_sources(graph, "python", workers=2)) == expected
+            cond = cond and list(calc_all_sources(graph, "numpy", True, workers=2)) == expected
+    if cond:print("Test 8 passed")
+    else:print("Test 8 failed")
+
+def test_9():# Test 9: Every engine reconstructs the same routes and names the negative cycle
+    cond = True
+    for engine in ("python", "numpy", "spfa"):
+        for graph in (chain, SparseGraph.from_matrix(chain)):
+            result = calc_shortest_paths(graph, 0, engine)
+            cond = cond and result.path_to(3) == [0, 1, 2, 3] and result.path_to(0) == [0]
+            cond = cond and calc_shortest_paths(graph, 3, engine).path_to(0) is None
+        for graph in (negative_cycle, SparseGraph.from_matrix(negative_cycle)):
+            result = calc_shortest_paths(graph, 0, engine)
+            cond = cond and result.distances == [None] * 4 and result.negative_cycle == [1, 2]
+            cond = cond and calc_shortest_paths(graph, 3, engine).negative_cycle is None
+    if cond:print("Test 9 passed")
+    else:print("Test 9 failed")
+
+def test_10():# Test 10: Distance-vector simulation converges to the Bellman-Ford routes after link failures
+    graph = random_network(40, 3, 3, seed=10)
+    cond = True
+    for split_horizon, poisoned_reverse in ((False, False), (True, False), (False, True)):
+        reports = asyncio.run(simulate(graph, [(0, 1), (5, 6)], split_horizon, poisoned_reverse, 16, verify=True))
+        cond = cond and len(reports) == 3 and all(report["correct"] for report in reports)
+    if cond:print("Test 10 passed")
+    else:print("Test 10 failed")
+
+def test_11():# Test 11: Binary cache is reused while the text is unchanged and rebuilt after an edit
+    cond = True
+    with tempfile.TemporaryDirectory() as directory:
+        for input_format, text in (("matrix", "2\n0\n5\nf\n0\n"), ("edges", "2\n0 1 5\n")):
+            input_path = os.path.join(directory, f"graph.{input_format}")
+            cache_path = input_path + ".bfcache"
+            with open(input_path, "w") as file: file.write(text)
+            parsed = load_graph(input_path, input_format, cache_path)
+            built = os.stat(cache_path).st_ino
+            cached = load_graph(input_path, input_format, cache_path)
+            cond = cond and os.stat(cache_path).st_ino == built
+            cond = cond and every_source(cached) == every_source(parsed) == [[0, 5], [inf, 0]]
+            with open(input_path, "w") as file: file.write(text.replace("5", "7"))
+            os.utime(input_path, ns=(0, 10**9))
+            cond = cond and every_source(load_graph(input_path, input_format, cache_path)) == [[0, 7], [inf, 0]]
+            cond = cond and os.stat(cache_path).st_ino != built
+            cond = cond and every_source(load_graph(input_path, input_format, cache_path), "numpy") == [[0, 7], [inf, 0]]
+    if cond:print("Test 11 passed")
+    else:print("Test 11 failed")
+
+if __name__ == "__main__":
+    test_1()
+    test_2()
+    test_3()
+    test_4()
+    test_5()
+    test_6()
+    test_7()
+    test_8()
+    test_9()
+    test_10()
+    test_11()
@@ -0,0 +1,320 @@
+#Elizabeth Dorfman
+#Benchmark of the GBN packet formats and of whole transfers with packet loss.
+
+import argparse
+import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from go_back_n import GBN_sender, GBN_receiver, LossyQueue
+from link import BottleneckLink
+
+logger = logging.getLogger("benchmark_gbn")
+
+
+def time_format(input_path, output_path, packet_format, packet_len):
+    # Sender side is prepare_packets, receiver side is splitting every packet
+    # and writing the file, the queues and the protocol are left out
+    start = time.perf_counter()
+    sender = GBN_sender(
+        input_path, 1, packet_len, None, None, None, 1, logger, packet_format
+    )
+    prepare_time = time.perf_counter() - start
+
+    receiver = GBN_receiver(output_path, None, None, logger)
+    start = time.perf_counter()
+    for packet in sender.packets:
+        sequence_num, data = receiver.extract_payload(packet)
+        receiver.packet_list.append(data)
+    receiver.write_to_file()
+    reassemble_time = time.perf_counter() - start
+    return prepare_time, reassemble_time, len(sender.packets)
+
+
+def benchmark_formats(sizes, packet_bytes):
+    with tempfile.TemporaryDirectory() as directory:
+        input_path = os.path.join(directory, "input.txt")
+        output_path = os.path.join(directory, "output.txt")
+        for size in sizes:
+            # Text so that the "bits" format can read it too
+            with open(input_path, "w") as file:
+                file.write(("Hello World " * (size // 12 + 1))[:size])
+            megabytes = size / 1e6
+            results = []
+            # The bits format spends 8 characters per byte and 16 on the sequence number
+            for packet_format, packet_len in (
+                ("bits", packet_bytes * 8 + 16),
+                ("binary", packet_bytes + 4),
+            ):
+                prepare_time, reassemble_time, num_packets = time_format(
+                    input_path, output_path, packet_format, packet_len
+                )
+                with open(input_path, "rb") as sent, open(output_path, "rb") as received:
+                    if sent.read() != received.read():
+                        print(f"{size} bytes: {packet_format} output differs!")
+                results.append(
+                    f"{packet_format} prepare {megabytes / prepare_time:.1f} MB/s, "
+                    f"reassemble {megabytes / reassemble_time:.1f} MB/s"
+                )
+            print(f"{size} bytes ({num_packets} packets): " + ", ".join(results))
+
+
+def time_transfer(
+    input_path,
+    output_path,
+    window_size,
+    packet_len,
+    nth_packet,
+    timeout,
+    ack_loss=0,
+    processing_delay=0,
+    propagation_delay=0,
+):
+    # One complete binary transfer between a sender and receiver thread,
+    # ack_loss is the chance that each ack is lost. With a propagation delay
+    # packets and acks each cross their own delay link
+    send_queue, ack_queue = queue.Queue(), LossyQueue(ack_loss, seed=0)
+    if propagation_delay:
+        send_queue = BottleneckLink(propagation_delay=propagation_delay).attach()
+        ack_queue = BottleneckLink(
+            propagation_delay=propagation_delay, loss_rate=ack_loss, seed=0
+        ).attach()
+    sender = GBN_sender(
+        input_path, window_size, packet_len, nth_packet, send_queue, ack_queue,
+        timeout, logger, "binary",
+    )
+    receiver = GBN_receiver(output_path, send_queue, ack_queue, logger, processing_delay)
+    start = time.perf_counter()
+    sender_thread = threading.Thread(target=sender.run)
+    sender_thread.start()
+    receiver.run()
+    sender_thread.join()
+    return time.perf_counter() - start
+
+
+def benchmark_transfers(
+    size,
+    packet_bytes,
+    windows,
+    timeouts,
+    nth_packet,
+    ack_loss,
+    processing_delay=0,
+    propagation_delay=0,
+):
+    with tempfile.TemporaryDirectory() as directory:
+        input_path = os.path.join(directory, "input.bin")
+        output_path = os.path.join(directory, "output.bin")
+        with open(input_path, "wb") as file:
+            file.write(os.urandom(size))
+        for window_size in windows:
+            results = []
+            for timeout in timeouts:
+                elapsed = time_transfer(
+                    input_path, output_path, window_size, packet_bytes + 4,
+                    nth_packet, timeout, ack_loss, processing_delay, propagation_delay,
+                )
+                with open(input_path, "rb") as sent, open(output_path, "rb") as received:
+                    if sent.read() != received.read():
+                        print(f"window {window_size} timeout {timeout}: output differs!")
+                results.append(
+                    f"timeout {timeout * 1000:g} ms {elapsed:.2f} s "
+                    f"({size / 1e6 / elapsed:.2f} MB/s)"
+                )
+            print(
+                f"window {window_size}, {ack_loss:.0%} ack loss: " + ", ".join(results)
+            )
+
+
+def benchmark_bottleneck(size, packet_bytes, windows, timeout, bandwidth, buffer_size):
+    # Fixed windows against congestion control through a bandwidth and buffer
+    # limited link, acks come back on a plain queue
+    with tempfile.TemporaryDirectory() as directory:
+        input_path = os.path.join(directory, "input.bin")
+        output_path = os.path.join(directory, "output.bin")
+        with open(input_path, "wb") as file:
+            file.write(os.urandom(size))
+        for window_size in windows:
+            results = []
+            for congestion_control in (False, True):
+                link = BottleneckLink(bandwidth, buffer_size)
+                send_queue, ack_queue = link.attach(), queue.Queue()
+                sender = GBN_sender(
+                    input_path, window_size, packet_bytes + 4, None, send_queue,
+                    ack_queue, timeout, logger, "binary", False, congestion_control,
+                )
+                receiver = GBN_receiver(output_path, send_queue, ack_queue, logger)
+                start = time.perf_counter()
+                sender_thread = threading.Thread(target=sender.run)
+                sender_thread.start()
+                receiver.run()
+                sender_thread.join()
+                elapsed = time.perf_counter() - start
+                with open(input_path, "rb") as sent, open(output_path, "rb") as received:
+                    if sent.read() != received.read():
+                        print(f"window {window_size}: output differs!")
+                results.append(
+                    f"{'congestion control' if congestion_control else 'fixed window'} "
+                    f"{size / 1e6 / elapsed:.3f} MB/s, {link.dropped} dropped, "
+                    f"{sender.retransmissions} retransmitted"
+                )
+            print(f"window {window_size}: " + ", ".join(results))
+
+
+def benchmark_streaming(size, packet_bytes, window_size):
+    # Buffered receiver against streaming receiver, peak traced memory covers both ends
+    # and the sender's packets are the same in both runs
+    with tempfile.TemporaryDirectory() as directory:
+        input_path = os.path.join(directory, "input.bin")
+        output_path = os.path.join(directory, "output.bin")
+        with open(input_path, "wb") as file:
+            file.write(os.urandom(size))
+        results = []
+        for streaming in (False, True):
+            tracemalloc.start()
+            send_queue, ack_queue = queue.Queue(), queue.Queue()
+            sender = GBN_sender(
+                input_path, window_size, packet_bytes + 4, None, send_queue, ack_queue,
+                1, logger, "binary",
+            )
+            receiver = GBN_receiver(
+                output_path, send_queue, ack_queue, logger, streaming=streaming
+            )
+            start = time.perf_counter()
+            sender_thread = threading.Thread(target=sender.run)
+            sender_thread.start()
+            receiver.run()
+            sender_thread.join()
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            with open(input_path, "rb") as sent, open(output_path, "rb") as received:
+                if sent.read() != received.read():
+                    print(f"streaming={streaming}: output differs!")
+            results.append(
+                f"{'streaming' if streaming else 'buffered'} {elapsed:.2f} s, "
+                f"peak {peak / 1e6:.1f} MB, {receiver.bytes_written} bytes written"
+            )
+        print(f"{size} bytes: " + ", ".join(results))
+
+
+def benchmark_lazy(size, packet_bytes, window_size):
+    # Packets built up front against packets built from a memory mapped input on
+    # demand, the receiver streams in both runs
+    with tempfile.TemporaryDirectory() as directory:
+        input_path = os.path.join(directory, "input.bin")
+        output_path = os.path.join(directory, "output.bin")
+        with open(input_path, "wb") as file:
+            file.write(os.urandom(size))
+        results = []
+        for lazy in (False, True):
+            tracemalloc.start()
+            send_queue, ack_queue = queue.Queue(), queue.Queue()
+            start = time.perf_counter()
+            sender = GBN_sender(
+                input_path, window_size, packet_bytes + 4, None, send_queue, ack_queue,
+                1, logger, "binary", lazy=lazy,
+            )
+            startup = time.perf_counter() - start
+            receiver = GBN_receiver(
+                output_path, send_queue, ack_queue, logger, streaming=True
+            )
+            sender_thread = threading.Thread(target=sender.run)
+            sender_thread.start()
+            receiver.run()
+            sender_thread.join()
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            with open(input_path, "rb") as sent, open(output_path, "rb") as received:
+                if sent.read() != received.read():
+                    print(f"lazy={lazy}: output differs!")
+            results.append(
+                f"{'lazy' if lazy else 'eager'} startup {startup * 1000:.1f} ms, "
+                f"total {elapsed:.2f} s, peak {peak / 1e6:.1f} MB"
+            )
+        print(f"{size} bytes: " + ", ".join(results))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark GBN packet formats")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument(
+        "--payload", type=int, default=1024, help="data bytes in each packet"
+    )
+    parser.add_argument(
+        "--transfer",
+        action="store_true",
+        help="time whole transfers of the first size with loss instead",
+    )
+    parser.add_argument("--windows", type=int, nargs="+", default=[4, 64])
+    parser.add_argument(
+        "--timeouts", type=float, nargs="+", default=[0.1, 1.0], help="seconds"
+    )
+    parser.add_argument(
+        "--nth-packet", type=int, default=50, help="drop every nth packet once"
+    )
+    parser.add_argument(
+        "--ack-loss", type=float, default=0, help="chance that each ack is lost"
+    )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="compare peak memory of a buffered and a streaming receiver on the first size",
+    )
+    parser.add_argument(
+        "--lazy",
+        action="store_true",
+        help="compare startup and peak memory of eager and lazy packets on the first size",
+    )
+    parser.add_argument(
+        "--processing-delay",
+        type=float,
+        default=0,
+        help="receiver seconds per packet, 0.001 matches the old fixed sleep",
+    )
+    parser.add_argument(
+        "--propagation-delay", type=float, default=0, help="one way seconds"
+    )
+    parser.add_argument(
+        "--bottleneck",
+        type=float,
+        metavar="BYTES_PER_SECOND",
+        help="send the first size through a bottleneck link of this bandwidth, "
+        "with and without congestion control",
+    )
+    parser.add_argument(
+        "--buffer", type=int, default=16384, help="bottleneck buffer in bytes"
+    )
+    args = parser.parse_args()
+
+    if args.lazy:
+        benchmark_lazy(args.sizes[0], args.payload, args.windows[-1])
+    elif args.streaming:
+        benchmark_streaming(args.sizes[0], args.payload, args.windows[-1])
+    elif args.bottleneck:
+        benchmark_bottleneck(
+            args.sizes[0],
+            args.payload,
+            args.windows,
+            args.timeouts[0],
+            args.bottleneck,
+            args.buffer,
+        )
+    elif args.transfer:
+        benchmark_transfers(
+            args.sizes[0],
+            args.payload,
+            args.windows,
+            args.timeouts,
+            args.nth_packet,
+            args.ack_loss,
+            args.processing_delay,
+            args.propagation_delay,
+        )
+    else:
+        benchmark_formats(args.sizes, args.payload)
@@ -0,0 +1,85 @@
+#Elizabeth Dorfman
+#Benchmark of file transfers between two processes over the UDP transport.
+
+import argparse
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+
+from go_back_n import GBN_sender, GBN_receiver
+from selective_repeat import SR_sender, SR_receiver
+from udp_transport import UDPTransport
+
+logger = logging.getLogger("benchmark_udp")
+
+PROTOCOLS = {"gbn": (GBN_sender, GBN_receiver), "sr": (SR_sender, SR_receiver)}
+
+
+def run_receiver(protocol, output_path, ack_loss, connection):
+    # Receiver process, sends its address back so the sender knows where to send
+    transport = UDPTransport(loss_rate=ack_loss, seed=1)
+    connection.send(transport.address)
+    receiver = PROTOCOLS[protocol][1](output_path, transport, transport, logger)
+    receiver.run()
+    transport.close()
+
+
+def time_udp_transfer(protocol, input_path, output_path, window_size, packet_len, timeout, loss, ack_loss):
+    parent_connection, child_connection = multiprocessing.Pipe()
+    process = multiprocessing.Process(
+        target=run_receiver, args=(protocol, output_path, ack_loss, child_connection)
+    )
+    process.start()
+    transport = UDPTransport(peer_address=parent_connection.recv(), loss_rate=loss, seed=0)
+    sender = PROTOCOLS[protocol][0](
+        input_path, window_size, packet_len, None, transport, transport,
+        timeout, logger, "binary", True,
+    )
+    start = time.perf_counter()
+    sender.run()
+    process.join()
+    elapsed = time.perf_counter() - start
+    transport.close()
+    return elapsed, sender, transport
+
+
+def benchmark_udp(size, packet_bytes, windows, losses, ack_loss, timeout):
+    with tempfile.TemporaryDirectory() as directory:
+        input_path = os.path.join(directory, "input.bin")
+        output_path = os.path.join(directory, "output.bin")
+        with open(input_path, "wb") as file:
+            file.write(os.urandom(size))
+        for loss in losses:
+            for window_size in windows:
+                results = []
+                for protocol in PROTOCOLS:
+                    elapsed, sender, transport = time_udp_transfer(
+                        protocol, input_path, output_path, window_size,
+                        packet_bytes + 4, timeout, loss, ack_loss,
+                    )
+                    with open(input_path, "rb") as sent, open(output_path, "rb") as received:
+                        if sent.read() != received.read():
+                            print(f"{protocol}: output differs!")
+                    results.append(
+                        f"{protocol} {size / 1e6 / elapsed:.2f} MB/s "
+                        f"({transport.sent} datagrams, {transport.lost} lost, "
+                        f"{sender.retransmissions} retransmitted)"
+                    )
+                print(f"loss {loss:.0%}, window {window_size}: " + ", ".join(results))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark ARQ transfers over UDP")
+    parser.add_argument("--size", type=int, default=1000000, help="bytes to transfer")
+    parser.add_argument("--payload", type=int, default=1024, help="data bytes in each packet")
+    parser.add_argument("--windows", type=int, nargs="+", default=[16, 64])
+    parser.add_argument(
+        "--loss", type=float, nargs="+", default=[0, 0.02], help="data packet loss rates"
+    )
+    parser.add_argument("--ack-loss", type=float, default=0)
+    parser.add_argument("--timeout", type=float, default=0.1, help="initial rto in seconds")
+    args = parser.parse_args()
+
+    benchmark_udp(args.size, args.payload, args.windows, args.loss, args.ack_loss, args.timeout)
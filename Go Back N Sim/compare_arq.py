@@ -0,0 +1,103 @@
+#Elizabeth Dorfman
+#Compares Go-Back-N and Selective Repeat goodput and retransmissions across loss rates and window sizes.
+
+import argparse
+import csv
+import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+
+from go_back_n import GBN_sender, GBN_receiver, LossyQueue
+from selective_repeat import SR_sender, SR_receiver
+
+logger = logging.getLogger("compare_arq")
+
+PROTOCOLS = {"gbn": (GBN_sender, GBN_receiver), "sr": (SR_sender, SR_receiver)}
+
+
+def run_transfer(protocol, input_path, output_path, window_size, packet_len, loss_rate, timeout, adaptive=False, seed=0):
+    # Packets are lost on the send queue at random, acks always arrive
+    # With adaptive the timeout only seeds the rto
+    sender_class, receiver_class = PROTOCOLS[protocol]
+    send_queue, ack_queue = LossyQueue(loss_rate, seed), queue.Queue()
+    sender = sender_class(
+        input_path, window_size, packet_len, None, send_queue, ack_queue,
+        timeout, logger, "binary", adaptive,
+    )
+    receiver = receiver_class(output_path, send_queue, ack_queue, logger)
+    start = time.perf_counter()
+    sender_thread = threading.Thread(target=sender.run)
+    sender_thread.start()
+    receiver.run()
+    sender_thread.join()
+    elapsed = time.perf_counter() - start
+    with open(input_path, "rb") as sent, open(output_path, "rb") as received:
+        correct = sent.read() == received.read()
+    return {
+        "elapsed": elapsed,
+        "goodput": os.path.getsize(input_path) / 1e6 / elapsed,
+        "packets": len(sender.packets),
+        "retransmissions": sender.retransmissions,
+        "lost": send_queue.lost,
+        "rtt_samples": sender.rtt_samples,
+        "correct": correct,
+    }
+
+
+def compare(size, packet_bytes, loss_rates, windows, timeout, adaptive=False, samples_path=None):
+    # adaptive adds a run of each protocol with the adaptive rto, samples_path
+    # collects every rtt sample as csv to plot the rto against the fixed timeout
+    modes = [False, True] if adaptive else [False]
+    samples = []
+    with tempfile.TemporaryDirectory() as directory:
+        input_path = os.path.join(directory, "input.bin")
+        output_path = os.path.join(directory, "output.bin")
+        with open(input_path, "wb") as file:
+            file.write(os.urandom(size))
+        for loss_rate in loss_rates:
+            for window_size in windows:
+                results = []
+                for protocol in PROTOCOLS:
+                    for mode in modes:
+                        result = run_transfer(
+                            protocol, input_path, output_path, window_size,
+                            packet_bytes + 4, loss_rate, timeout, mode,
+                        )
+                        name = protocol + (" adaptive" if mode else "")
+                        if not result["correct"]:
+                            print(f"{name}: output differs!")
+                        for elapsed, rtt, rto in result["rtt_samples"]:
+                            samples.append((name, loss_rate, window_size, elapsed, rtt, rto))
+                        results.append(
+                            f"{name} {result['goodput']:.3f} MB/s, "
+                            f"{result['retransmissions']} retransmitted ({result['lost']} lost)"
+                        )
+                print(f"loss {loss_rate:.0%}, window {window_size}: " + ", ".join(results))
+    if samples_path:
+        with open(samples_path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["mode", "loss", "window", "time", "rtt", "rto"])
+            writer.writerows(samples)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare Go-Back-N and Selective Repeat")
+    parser.add_argument("--size", type=int, default=100000, help="bytes to transfer")
+    parser.add_argument("--payload", type=int, default=1024, help="data bytes in each packet")
+    parser.add_argument("--loss", type=float, nargs="+", default=[0, 0.05, 0.2])
+    parser.add_argument("--windows", type=int, nargs="+", default=[4, 16, 64])
+    parser.add_argument("--timeout", type=float, default=0.1, help="seconds")
+    parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        help="also run each protocol with the adaptive rto seeded by --timeout",
+    )
+    parser.add_argument(
+        "--samples", help="write every rtt sample and the rto after it to this csv file"
+    )
+    args = parser.parse_args()
+
+    compare(args.size, args.payload, args.loss, args.windows, args.timeout, args.adaptive, args.samples)
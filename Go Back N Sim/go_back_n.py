@@ -1,7 +1,87 @@
 # Elizabeth Dorfman
 # Simulation of the Go-Back-N Automatic Repeat Request (ARQ) protocol for reliable data transmission.
 
-import time, threading, queue, logging, select
+import time, threading, queue, logging, select, struct, random, mmap, os, collections
+
+# Header of a binary packet, a 32 bit sequence number in network byte order
+PACKET_HEADER = struct.Struct("!I")
+
+# Adaptive retransmission timeout constants from RFC 6298, in seconds
+RTO_ALPHA = 1 / 8
+RTO_BETA = 1 / 4
+RTO_K = 4
+MIN_RTO = 0.01
+MAX_RTO = 60
+
+# RTT samples kept for plotting, the oldest are dropped after this many
+MAX_RTT_SAMPLES = 100000
+
+# Duplicate acks that trigger a fast retransmit
+DUP_ACK_THRESHOLD = 3
+
+# Bytes a streaming receiver writes between flushes
+CHECKPOINT_BYTES = 1 << 20
+
+
+class LazyPackets:
+    # Read only sequence of binary packets over a memory mapped input file, packet i is
+    # built from its offset when first asked for and kept in a cache of cache_size packets
+    def __init__(self, input_file, payload_size, cache_size):
+        if hasattr(input_file, "fileno"):
+            self.file = None
+            fileno = input_file.fileno()
+        else:
+            self.file = open(input_file, "rb")
+            fileno = self.file.fileno()
+        self.payload_size = payload_size
+        self.cache_size = cache_size
+        self.cache = {}
+        self.size = os.fstat(fileno).st_size
+        # An empty file cannot be mapped, and has no packets anyway
+        self.map = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ) if self.size else None
+        self.length = -(-self.size // payload_size)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, i):
+        packet = self.cache.get(i)
+        if packet is None:
+            if not 0 <= i < self.length:
+                raise IndexError("packet index out of range")
+            offset = i * self.payload_size
+            packet = PACKET_HEADER.pack(i) + self.map[offset : offset + self.payload_size]
+            if len(self.cache) >= self.cache_size:
+                # Oldest packet first, the window only moves forward
+                del self.cache[next(iter(self.cache))]
+            self.cache[i] = packet
+        return packet
+
+    def close(self):
+        if self.map:
+            self.map.close()
+        if self.file:
+            self.file.close()
+
+
+class WindowState:
+    # Per packet values indexed like a list but stored in a dict, entries that fall below
+    # the window are discarded so memory follows the window instead of the file
+    def __init__(self, default):
+        self.default = default
+        self.values = {}
+        self.low = 0
+
+    def __getitem__(self, i):
+        return self.values.get(i, self.default)
+
+    def __setitem__(self, i, value):
+        self.values[i] = value
+
+    def discard_below(self, i):
+        for old in range(self.low, i):
+            self.values.pop(old, None)
+        self.low = max(self.low, i)
 
 
 class GBN_sender:
@@ -15,32 +95,87 @@ class GBN_sender:
         ack_queue,
         timeout_interval,
         logger,
+        packet_format="bits",
+        adaptive_timeout=False,
+        congestion_control=False,
+        lazy=False,
     ):
         try:
             # Assign inputs to instance variables
+            # input_file is a path, or in binary format also a readable binary file object
             self.input_file = input_file
             self.window_size = window_size
+            # "bits" packets are strings of '0'/'1' with a 16 bit sequence number at the end,
+            # "binary" packets are bytes with PACKET_HEADER in front and packet_len counts bytes
+            self.packet_format = packet_format
             self.packet_len = packet_len
             self.nth_packet = nth_packet
             self.send_queue = send_queue
             self.ack_queue = ack_queue
             self.timeout_interval = timeout_interval
             self.logger = logger
+            # With adaptive_timeout the retransmission timeout starts at timeout_interval and then
+            # follows the measured round trip times, otherwise it stays at timeout_interval
+            self.adaptive_timeout = adaptive_timeout
+            self.rto = timeout_interval
+            self.srtt = None
+            self.rttvar = None
+            # (seconds since run started, round trip time, rto afterwards) for the latest valid samples
+            self.rtt_samples = collections.deque(maxlen=MAX_RTT_SAMPLES)
+            self.start_time = time.monotonic()
+            # With congestion_control the window is the congestion window in packets, capped at window_size,
+            # it starts in slow start and halves on duplicate acks or drops to 1 on a timeout
+            self.congestion_control = congestion_control
+            self.cwnd = 1 if congestion_control else window_size
+            self.ssthresh = window_size
+            self.dup_acks = 0
+            # Last packet sent before the latest loss recovery and when it started, duplicate acks
+            # caused by that recovery's own resends do not start another fast retransmit (RFC 6582).
+            # Resent copies of packets that already arrived also come back as duplicate acks,
+            # so they are ignored for one round trip after the recovery
+            self.recover = -1
+            self.recovery_time = 0
+            # (seconds since run started, cwnd) after every change
+            self.cwnd_history = [(0, self.cwnd)]
+            # With lazy binary packets are built from a memory mapped input as they are sent,
+            # so nothing is read up front. Bit string packets are always built up front
+            self.lazy = lazy
 
             # Base of sliding window/ sequence # of first unacknowledged packet
             self.base = 0
-            # List of all created packets
+            # Sequence # of the first packet that has never been sent
+            self.next_seq_num = 0
+            # List of all created packets, or a LazyPackets sequence
             self.packets = self.prepare_packets()
-            # A list that tracks which packets have been acknowledged. Initialized to a list of False values with the same length as the packets list.
-            self.acks_list = [False for i in range(len(self.packets))]
-            # A list that keeps track of the timeout for each packet. Initialized to a list of 0 values with the same length as the packets list.
-            self.packet_timers = [0 for i in range(len(self.packets))]
-            # A list to track which packets have already been dropped (if using simulated packet loss). Initialized to an empty list.
-            self.dropped_list = []
+            # Tracks which packets have been acknowledged. Only packets from the base on are kept, all False at first.
+            self.acks_list = WindowState(False)
+            # Keeps track of when each packet in the window was last sent, 0 at first.
+            self.packet_timers = WindowState(0)
+            # Tracks which packets have already been dropped (if using simulated packet loss). Only packets from the base on are kept.
+            self.dropped = WindowState(False)
+            # How many times each packet has been put on the link, and how many of those were resends
+            self.transmit_counts = WindowState(0)
+            self.retransmissions = 0
+            # Guards base and the timers, run sleeps on it until the base packet's deadline
+            # and receive_acks wakes it whenever the window moves
+            self.condition = threading.Condition()
         except Exception as e:
             print(f"Error in GBN sender initialization: {e}.")
 
     def prepare_packets(self):
+        if self.packet_format == "binary" and self.lazy:
+            try:
+                num_data_in_packet = self.packet_len - PACKET_HEADER.size
+                if num_data_in_packet <= 0:
+                    raise ValueError(f"packet_len must be more than {PACKET_HEADER.size} bytes")
+                packets = LazyPackets(self.input_file, num_data_in_packet, 2 * self.window_size)
+                print(f"packets number:{len(packets)}")
+                return packets
+            except Exception as e:
+                print(f"Error in GBN sender prepare lazy packets: {e}.")
+                return None
+        if self.packet_format == "binary":
+            return self.prepare_binary_packets()
         try:
             file = open(self.input_file, "r")
             text = file.read()
@@ -67,98 +202,207 @@ class GBN_sender:
         finally:
             file.close()
 
-    def send_packets(self):
+    def prepare_binary_packets(self):
+        file = None
         try:
-            i = self.base
-
-            while i < min(self.base + self.window_size, len(self.packets)):
-                self.logger.info(f"sending packet {i}")
-                if (
-                    i != 0
-                    and (i + 1) % self.nth_packet == 0
-                    and i not in self.dropped_list
-                ):
-                    self.dropped_list.append(i)
-                    self.logger.info(f"packet {i} dropped")
-                else:
-                    self.send_queue.put(self.packets[i])
-                self.packet_timers[i] = time.time()
-                i += 1
-            # starts from the base and sends packets in sliding window
+            # Read the payload of one packet at a time so any binary file or stream works
+            # and the data is never expanded into one character per bit
+            if hasattr(self.input_file, "read"):
+                stream = self.input_file
+            else:
+                file = stream = open(self.input_file, "rb")
+            num_data_in_packet = self.packet_len - PACKET_HEADER.size
+            if num_data_in_packet <= 0:
+                raise ValueError(f"packet_len must be more than {PACKET_HEADER.size} bytes")
+            packets = []
+            data = stream.read(num_data_in_packet)
+            while data:
+                packets.append(PACKET_HEADER.pack(len(packets)) + data)
+                data = stream.read(num_data_in_packet)
 
-            # logs an informational message for each packet will be sent, using the logger object
+            print(f"packets number:{len(packets)}")
+            return packets
+        except Exception as e:
+            print(f"Error in GBN sender prepare binary packets: {e}.")
+        finally:
+            if file:
+                file.close()
 
-            # Send
-            # Start timer for each packet
-            # Enqueue packet in send queue
+    def should_drop(self, i):
+        # Simulated loss, every nth packet is dropped the first time it is sent
+        # nth_packet of None sends everything
+        return (
+            self.nth_packet is not None
+            and i != 0
+            and (i + 1) % self.nth_packet == 0
+            and not self.dropped[i]
+        )
 
-            # if the packet is nth then it is not enqueued and appended to dropped_list array
-            # Log dropped packet
+    def send_packet(self, i):
+        self.logger.info(f"sending packet {i}")
+        self.transmit_counts[i] += 1
+        if self.transmit_counts[i] > 1:
+            self.retransmissions += 1
+        if self.should_drop(i):
+            self.dropped[i] = True
+            self.logger.info(f"packet {i} dropped")
+        else:
+            self.send_queue.put(self.packets[i])
+        self.packet_timers[i] = time.monotonic()
+
+    def send_packets(self):
+        try:
+            # starts from the base and sends packets in sliding window
+            # used for the first window and to retransmit the window after a timeout
+            # the receiver discards everything after a gap, so sending goes back to the
+            # end of this window even if the congestion window shrank below packets already sent
+            end = min(self.base + self.effective_window(), len(self.packets))
+            for i in range(self.base, end):
+                self.send_packet(i)
+            self.next_seq_num = end
         except Exception as e:
             print(f"Error in GBN sender send packets: {e}.")
 
-    def send_next_packet(self):
+    def advance_window(self, new_base):
         try:
             # called from receive_acks
-            # increments the base
-            # sends last one from window
-            self.base += 1
-            i = self.base + self.window_size - 1
-            if i < len(self.packets):
-                if (
-                    i != 0
-                    and (i + 1) % self.nth_packet == 0
-                    and i not in self.dropped_list
-                ):
-                    print(self.dropped_list)
-                    self.dropped_list.append(i)
-                    self.logger.info(f"packet {i} dropped")
-                else:
-                    self.send_queue.put(self.packets[i])
-                    self.logger.info(f"sending packet {i}")
-                self.packet_timers[i] = time.time()
-
+            # an ack is cumulative so every packet before new_base is acknowledged
+            # slides the window and sends every packet that entered it at once
+            for i in range(self.base, new_base):
+                self.acks_list[i] = True
+            self.base = new_base
+            self.forget_acknowledged()
+            end = min(self.base + self.effective_window(), len(self.packets))
+            # send_packets can pull next_seq_num back after a loss, packets below the new base
+            # are already acknowledged even if they were never sent again
+            for i in range(max(self.next_seq_num, self.base), end):
+                self.send_packet(i)
+            self.next_seq_num = max(self.next_seq_num, end)
         except Exception as e:
-            print(f"Error in GBN_sender send next packet: {e}.")
+            print(f"Error in GBN_sender advance window: {e}.")
+
+    def forget_acknowledged(self):
+        # Per packet state below the base is never read again
+        self.acks_list.discard_below(self.base)
+        self.packet_timers.discard_below(self.base)
+        self.transmit_counts.discard_below(self.base)
+        self.dropped.discard_below(self.base)
+
+    def send_next_packet(self):
+        # increments the base by one and sends the last one from window
+        self.advance_window(self.base + 1)
+
+    def effective_window(self):
+        # Packets allowed in flight, the whole window_size without congestion control
+        if self.congestion_control:
+            return max(1, min(int(self.cwnd), self.window_size))
+        return self.window_size
+
+    def grow_window(self, acked):
+        # Called for newly acknowledged packets, one packet per ack in slow start
+        # and about one packet per window in congestion avoidance
+        if not self.congestion_control:
+            return
+        for i in range(acked):
+            if self.cwnd < self.ssthresh:
+                self.cwnd += 1
+            else:
+                self.cwnd += 1 / self.cwnd
+        self.cwnd = min(self.cwnd, self.window_size)
+        self.cwnd_history.append((time.monotonic() - self.start_time, self.cwnd))
+
+    def shrink_window(self, timeout):
+        # Called on a loss, a timeout restarts slow start and duplicate acks halve the window
+        if not self.congestion_control:
+            return
+        self.ssthresh = max(self.cwnd / 2, 2)
+        self.cwnd = 1 if timeout else self.ssthresh
+        self.recover = self.next_seq_num - 1
+        self.recovery_time = time.monotonic()
+        self.cwnd_history.append((time.monotonic() - self.start_time, self.cwnd))
+
+    def in_recovery(self):
+        # True while duplicate acks may still be echoes of the latest recovery's resends
+        round_trip = self.srtt if self.srtt is not None else self.timeout_interval
+        return (
+            self.base <= self.recover
+            or time.monotonic() - self.recovery_time < round_trip
+        )
+
+    def timeout_deadline(self):
+        # Every packet in the window was sent no earlier than the base packet,
+        # so the base packet is the only timer that can expire first
+        return self.packet_timers[self.base] + self.rto
+
+    def sample_rtt(self, i):
+        # Called with the lock held when packet i is acknowledged
+        # Karn's rule, a resent packet's ack could belong to either copy so it gives no sample
+        if self.transmit_counts[i] != 1:
+            return
+        rtt = time.monotonic() - self.packet_timers[i]
+        if self.adaptive_timeout:
+            if self.srtt is None:
+                self.srtt = rtt
+                self.rttvar = rtt / 2
+            else:
+                self.rttvar = (1 - RTO_BETA) * self.rttvar + RTO_BETA * abs(self.srtt - rtt)
+                self.srtt = (1 - RTO_ALPHA) * self.srtt + RTO_ALPHA * rtt
+            self.rto = min(max(self.srtt + RTO_K * self.rttvar, MIN_RTO), MAX_RTO)
+        self.rtt_samples.append((time.monotonic() - self.start_time, rtt, self.rto))
+
+    def back_off_rto(self):
+        # Called on a timeout, the rto doubles until a new sample arrives
+        if self.adaptive_timeout:
+            self.rto = min(self.rto * 2, MAX_RTO)
 
     def check_timers(self):
         try:
             # called from run
-            # checks if packets have exceeeded timeout time
+            # checks if the oldest unacknowledged packet has exceeded the timeout time
             # logs a message indicating packet has timed out
-            current_time = time.time()
-            for i in range(
-                self.base, min(self.base + self.window_size, len(self.packets))
-            ):
-                if (current_time - self.packet_timers[i]) > self.timeout_interval:
-                    self.logger.info(f"packet {i} timed out")
-                    return True
+            if time.monotonic() >= self.timeout_deadline():
+                self.logger.info(f"packet {self.base} timed out")
+                self.back_off_rto()
+                self.shrink_window(True)
+                return True
             return False
         except Exception as e:
             print(f"Error in GBN_sender check timers: {e}.")
 
     def receive_acks(self):
         try:
-            # Listens for acknowledgements
-            while True:
-                try:
-                    ack = self.ack_queue.get(timeout=0.1)
-                    ack = int(ack)
-
-                    # Check if the ack is the right one
-                    # If it is we change the ack_list, log file and send next packet
-                    if self.base == ack and not self.acks_list[ack]:
-                        self.acks_list[ack] = True
+            # Listens for acknowledgements until the last packet is acknowledged,
+            # blocking on the ack queue instead of polling it
+            while self.base < len(self.packets):
+                ack = int(self.ack_queue.get())
+
+                # An ack for n acknowledges every packet up to n, so a lost ack
+                # is covered by any later one
+                # If it is new we change the ack_list, log file and slide the window
+                with self.condition:
+                    if self.base <= ack < len(self.packets):
                         self.logger.info(f"ack {ack} received")
-                        self.send_next_packet()  # This increments base
+                        self.sample_rtt(ack)
+                        self.dup_acks = 0
+                        self.grow_window(ack + 1 - self.base)
+                        self.advance_window(ack + 1)
+                        # New base packet, so run has a new deadline
+                        self.condition.notify()
+                    elif (
+                        self.congestion_control
+                        and ack == self.base - 1
+                        and not self.in_recovery()
+                    ):
+                        # The receiver repeats its last ack for every packet after a gap
+                        self.dup_acks += 1
+                        self.logger.info(f"ack {ack} received, duplicate {self.dup_acks}")
+                        if self.dup_acks == DUP_ACK_THRESHOLD:
+                            self.logger.info(f"packet {self.base} fast retransmit")
+                            self.shrink_window(False)
+                            self.send_packets()
+                            self.condition.notify()
                     else:
                         self.logger.info(f"ack {ack} received, Ignoring")
-
-                    # Exit loop once last ack recorded
-                    if self.acks_list[len(self.packets) - 1]:
-                        return
-                except queue.Empty:
-                    continue
         except Exception as e:
             print(f"Error in GBN_sender receive acks: {e}.")
 
@@ -167,49 +411,103 @@ class GBN_sender:
             # Begins by calling send_packets() to transmit the packets in the sliding window
             # Starts a thread to receive acknowledgements
             # Loop- While the base has not reached the total number of packets
-            # It continuously checks for timeouts using check_timers()
+            # It sleeps until the base packet's deadline or until an ack moves the window
             # If a timeout occurs it retransmits the packets in the sliding window
             # At the end when all pafckets have been sent exit while loop
             # Enqueue a none to the send_queue to notify the receiver finished
-            self.send_packets()
+            self.start_time = time.monotonic()
+            with self.condition:
+                self.send_packets()
             ack_rec = threading.Thread(target=self.receive_acks)
             ack_rec.start()
-            while self.base < len(
-                self.packets
-            ):  # Continue until all packets are acknowledged
-                if self.check_timers():
-                    self.send_packets()  # Retransmit all packets within the current window
-                time.sleep(0.5)
+            with self.condition:
+                while self.base < len(
+                    self.packets
+                ):  # Continue until all packets are acknowledged
+                    if self.check_timers():
+                        self.send_packets()  # Retransmit all packets within the current window
+                    else:
+                        self.condition.wait(self.timeout_deadline() - time.monotonic())
 
             self.send_queue.put(None)
             ack_rec.join()
+            # Only a lazy binary sender holds a memory map to release
+            if isinstance(self.packets, LazyPackets):
+                self.packets.close()
         except Exception as e:
             print(f"Error in GBN_sender run: {e}.")
 
 
+class LossyQueue(queue.Queue):
+    # Queue that loses each item put into it with probability loss_rate,
+    # stands in for the send or ack queue to simulate an unreliable channel
+    def __init__(self, loss_rate, seed=None):
+        super().__init__()
+        self.loss_rate = loss_rate
+        self.random = random.Random(seed)
+        self.lost = 0
+
+    def put(self, item, block=True, timeout=None):
+        # None marks the end of the transfer and is never lost
+        if item is not None and self.random.random() < self.loss_rate:
+            self.lost += 1
+            return
+        super().put(item, block, timeout)
+
+
 class GBN_receiver:
-    def __init__(self, output_file, send_queue, ack_queue, logger):
+    def __init__(
+        self,
+        output_file,
+        send_queue,
+        ack_queue,
+        logger,
+        processing_delay=0,
+        streaming=False,
+        checkpoint_bytes=CHECKPOINT_BYTES,
+    ):
         try:
             # Assign parameters to instance variables
+            # output_file is a path, or in streaming mode also a writable binary file object or mmap
             self.output_file = output_file
             self.send_queue = send_queue
             self.ack_queue = ack_queue
             self.logger = logger
+            # Seconds spent on each packet, 0 runs at full speed
+            self.processing_delay = processing_delay
             # list to store received packets
             self.packet_list = []
             # Stores expected sequeunce num
             self.expected_seq_num = 0
+            # Set once a binary packet arrives, the output file is then written as bytes
+            self.binary = False
+            # With streaming every in order payload is written as it arrives instead of kept in
+            # packet_list, and the output is flushed every checkpoint_bytes
+            self.streaming = streaming
+            self.checkpoint_bytes = checkpoint_bytes
+            self.output = None
+            self.bytes_written = 0
+            self.last_checkpoint = 0
+            # Bits of a bit string packet that do not make up a whole byte yet
+            self.pending_bits = ""
 
         except Exception as e:
             print(f"Error in GBM receiver initialization: {e}.")
 
+    def extract_payload(self, packet):
+        # Split a packet into its sequence number and data, for either packet format
+        if isinstance(packet, (bytes, bytearray, memoryview)):
+            self.binary = True
+            return PACKET_HEADER.unpack_from(packet)[0], packet[PACKET_HEADER.size :]
+        return int(packet[-16:], 2), packet[:-16]
+
     def process_packet(self, packet):
         try:
-            time.sleep(0.001)
-            sequence_num = int(packet[-16:], 2)
-            data = packet[:-16]
+            if self.processing_delay:
+                time.sleep(self.processing_delay)
+            sequence_num, data = self.extract_payload(packet)
             if self.expected_seq_num == sequence_num:
-                self.packet_list.append(data)
+                self.deliver(data)
                 self.ack_queue.put(sequence_num)
                 self.logger.info(f"packet {sequence_num} received")
                 self.expected_seq_num += 1
@@ -225,17 +523,55 @@ class GBN_receiver:
         except Exception as e:
             print(f"Error in GBM receiver process packets: {e}.")
 
+    def open_output(self):
+        # Called from run in streaming mode, a path is opened here and closed in write_to_file
+        if hasattr(self.output_file, "write"):
+            self.output = self.output_file
+        else:
+            self.output = open(self.output_file, "wb")
+
+    def deliver(self, data):
+        # Hands over the next in order payload, kept for write_to_file or written straight out
+        if not self.streaming:
+            self.packet_list.append(data)
+            return
+        if isinstance(data, str):
+            # Bit strings are written a whole byte at a time, leftover bits wait for the next packet
+            bits = self.pending_bits + data
+            whole = len(bits) - len(bits) % 8
+            self.pending_bits = bits[whole:]
+            data = bytes(int(bits[i : i + 8], 2) for i in range(0, whole, 8))
+        self.output.write(data)
+        self.bytes_written += len(data)
+        if self.bytes_written - self.last_checkpoint >= self.checkpoint_bytes:
+            self.output.flush()
+            self.last_checkpoint = self.bytes_written
+            self.logger.info(f"checkpoint, {self.bytes_written} bytes written")
+
     def write_to_file(self):
+        f = None
         try:
             # Called from run
             # extracts data from packets and writes to file
+            if self.streaming:
+                # Everything is already written, flush the tail and close what open_output opened
+                self.output.flush()
+                if self.output is not self.output_file:
+                    self.output.close()
+                self.logger.info(f"Data successfully written to {self.output_file}")
+                return
+            if self.binary:
+                f = open(self.output_file, "wb")
+                self.bytes_written = f.write(b"".join(self.packet_list))
+                self.logger.info(f"Data successfully written to {self.output_file}")
+                return
             binary_data = "".join(self.packet_list)
             text_data = "".join(
                 chr(int(binary_data[i : i + 8], 2))
                 for i in range(0, len(binary_data), 8)
             )
             f = open(self.output_file, "w")
-            f.write(text_data)
+            self.bytes_written = f.write(text_data)
             self.logger.info(f"Data successfully written to {self.output_file}")
         except Exception as e:
             print(f"Error in GBM receiver write to file: {e}.")
@@ -248,15 +584,15 @@ class GBN_receiver:
             # Continuously listens for packets from the send queue until None packet
             # Each received packet is processed by calling process_packet()
             # Once all packets have been received, the data is written to the output file using write_to_file()
+            # Blocks on the queue so a packet is handled as soon as it arrives
+            if self.streaming:
+                self.open_output()
             while True:
-                try:
-                    packet = self.send_queue.get(timeout=0.1)
-                    if packet is None:
-                        break
-                    else:
-                        self.process_packet(packet)
-                except queue.Empty:
-                    continue
+                packet = self.send_queue.get()
+                if packet is None:
+                    break
+                else:
+                    self.process_packet(packet)
             self.write_to_file()
         except Exception as e:
             print(f"Error in GBN receiver run: {e}.")
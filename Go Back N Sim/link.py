@@ -0,0 +1,107 @@
+# Elizabeth Dorfman
+# Simulated link model, a bandwidth, buffer and delay limited stand in for the send or ack queue.
+
+import time, threading, queue, heapq, random
+
+
+def packet_size(packet):
+    # Bytes a packet takes on the link, a bit string packet carries one bit per character
+    if isinstance(packet, str):
+        return len(packet) // 8
+    if isinstance(packet, (bytes, bytearray, memoryview)):
+        return len(packet)
+    return 0
+
+
+class LinkEndpoint(queue.Queue):
+    # One flow's end of the link, packets put here cross the shared link and come
+    # out of this same queue once they have been transmitted
+    def __init__(self, link):
+        super().__init__()
+        self.link = link
+        self.dropped = 0
+
+    def put(self, item, block=True, timeout=None):
+        self.link.transmit(self, item)
+
+    def deliver(self, item):
+        super().put(item)
+
+
+class BottleneckLink:
+    # Serialises packets at bandwidth bytes per second through a drop tail buffer of
+    # buffer_size bytes, packets that do not fit are lost. Every packet then takes
+    # propagation_delay seconds to arrive, and loss_rate of them are lost at random on the way.
+    # None for bandwidth or buffer_size means unlimited, so the defaults give a link
+    # that adds no delay at all
+    def __init__(
+        self, bandwidth=None, buffer_size=None, propagation_delay=0, loss_rate=0, seed=None
+    ):
+        self.bandwidth = bandwidth
+        self.buffer_size = buffer_size
+        self.propagation_delay = propagation_delay
+        self.loss_rate = loss_rate
+        self.random = random.Random(seed)
+        # Time the link finishes sending everything accepted so far
+        self.next_free = time.monotonic()
+        # Heap of (arrival time, order, endpoint, packet) waiting to come out of the link
+        self.in_flight = []
+        self.order = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.lost = 0
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def attach(self):
+        # New endpoint for one flow, use it as that flow's send or ack queue
+        return LinkEndpoint(self)
+
+    def backlog(self, now):
+        # Bytes accepted but not yet sent
+        if self.bandwidth is None:
+            return 0
+        return max(0, self.next_free - now) * self.bandwidth
+
+    def transmit(self, endpoint, packet):
+        size = packet_size(packet)
+        with self.condition:
+            now = time.monotonic()
+            # None marks the end of a flow and always gets through
+            if (
+                packet is not None
+                and self.buffer_size is not None
+                and self.backlog(now) + size > self.buffer_size
+            ):
+                self.dropped += 1
+                endpoint.dropped += 1
+                return
+            self.next_free = max(self.next_free, now)
+            if self.bandwidth is not None:
+                self.next_free += size / self.bandwidth
+            if packet is not None and self.random.random() < self.loss_rate:
+                # Lost after using the link, so it still counts against the bandwidth
+                self.lost += 1
+                return
+            arrival = self.next_free + self.propagation_delay
+            heapq.heappush(self.in_flight, (arrival, self.order, endpoint, packet))
+            self.order += 1
+            self.condition.notify()
+
+    def run(self):
+        # Hands each packet to its endpoint when it reaches the far end of the link
+        with self.condition:
+            while True:
+                if not self.in_flight:
+                    self.condition.wait()
+                    continue
+                arrival = self.in_flight[0][0]
+                now = time.monotonic()
+                if arrival > now:
+                    self.condition.wait(arrival - now)
+                    continue
+                arrival, order, endpoint, packet = heapq.heappop(self.in_flight)
+                if packet is not None:
+                    self.delivered += 1
+                endpoint.deliver(packet)
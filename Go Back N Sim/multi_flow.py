@@ -0,0 +1,149 @@
+#Elizabeth Dorfman
+#Runs several ARQ flows at once over one shared bottleneck link and reports per flow metrics and fairness.
+
+import argparse
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from go_back_n import GBN_sender, GBN_receiver
+from link import BottleneckLink
+from selective_repeat import SR_sender, SR_receiver
+
+logger = logging.getLogger("multi_flow")
+
+PROTOCOLS = {"gbn": (GBN_sender, GBN_receiver), "sr": (SR_sender, SR_receiver)}
+
+
+def jain_fairness(values):
+    # 1 when every flow gets the same share, 1/n when one flow gets everything
+    if not values or not any(values):
+        return 0
+    return sum(values) ** 2 / (len(values) * sum(value * value for value in values))
+
+
+def run_flows(
+    input_path,
+    output_paths,
+    windows,
+    timeouts,
+    bandwidth,
+    buffer_size,
+    propagation_delay=0,
+    protocol="gbn",
+    packet_bytes=1024,
+    adaptive_timeout=False,
+    congestion_control=False,
+):
+    # One flow per output path, all sending input_path through the same data link,
+    # flow i uses windows[i % len(windows)] and timeouts[i % len(timeouts)].
+    # Acks share a second link that only adds the propagation delay
+    sender_class, receiver_class = PROTOCOLS[protocol]
+    link = BottleneckLink(bandwidth, buffer_size, propagation_delay)
+    ack_link = BottleneckLink(propagation_delay=propagation_delay)
+    flows = []
+    for i, output_path in enumerate(output_paths):
+        send_queue, ack_queue = link.attach(), ack_link.attach()
+        flow = {
+            "flow": i,
+            "window": windows[i % len(windows)],
+            "timeout": timeouts[i % len(timeouts)],
+            "send_queue": send_queue,
+        }
+        flow["sender"] = sender_class(
+            input_path, flow["window"], packet_bytes + 4, None, send_queue, ack_queue,
+            flow["timeout"], logger, "binary", adaptive_timeout, congestion_control, True,
+        )
+        flow["receiver"] = receiver_class(
+            output_path, send_queue, ack_queue, logger, streaming=True
+        )
+        flows.append(flow)
+
+    def run_flow(flow):
+        sender_thread = threading.Thread(target=flow["sender"].run)
+        sender_thread.start()
+        flow["receiver"].run()
+        flow["completion_time"] = time.perf_counter() - start
+        sender_thread.join()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=run_flow, args=(flow,)) for flow in flows]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    size = os.path.getsize(input_path)
+    reports = []
+    for flow in flows:
+        reports.append(
+            {
+                "flow": flow["flow"],
+                "window": flow["window"],
+                "timeout": flow["timeout"],
+                "completion_time": flow["completion_time"],
+                "throughput": size / flow["completion_time"],
+                "retransmissions": flow["sender"].retransmissions,
+                "dropped": flow["send_queue"].dropped,
+                "bytes_written": flow["receiver"].bytes_written,
+            }
+        )
+    fairness = jain_fairness([report["throughput"] for report in reports])
+    return reports, fairness, link
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-flow ARQ simulation over a shared bottleneck")
+    parser.add_argument("--flows", type=int, default=4)
+    parser.add_argument("--size", type=int, default=500000, help="bytes each flow sends")
+    parser.add_argument("--payload", type=int, default=1024, help="data bytes in each packet")
+    parser.add_argument(
+        "--windows", type=int, nargs="+", default=[16], help="window sizes, cycled over the flows"
+    )
+    parser.add_argument(
+        "--timeouts", type=float, nargs="+", default=[0.1], help="seconds, cycled over the flows"
+    )
+    parser.add_argument("--bandwidth", type=float, default=1000000, help="bytes per second")
+    parser.add_argument("--buffer", type=int, default=32768, help="drop tail buffer in bytes")
+    parser.add_argument("--propagation-delay", type=float, default=0.005, help="one way seconds")
+    parser.add_argument("--protocol", choices=sorted(PROTOCOLS), default="gbn")
+    parser.add_argument("--adaptive", action="store_true", help="adaptive retransmission timeout")
+    parser.add_argument("--congestion-control", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        input_path = os.path.join(directory, "input.bin")
+        with open(input_path, "wb") as file:
+            file.write(os.urandom(args.size))
+        output_paths = [os.path.join(directory, f"output{i}.bin") for i in range(args.flows)]
+        reports, fairness, link = run_flows(
+            input_path,
+            output_paths,
+            args.windows,
+            args.timeouts,
+            args.bandwidth,
+            args.buffer,
+            args.propagation_delay,
+            args.protocol,
+            args.payload,
+            args.adaptive,
+            args.congestion_control,
+        )
+        with open(input_path, "rb") as file:
+            sent = file.read()
+        for report, output_path in zip(reports, output_paths):
+            with open(output_path, "rb") as file:
+                correct = file.read() == sent
+            print(
+                f"flow {report['flow']} (window {report['window']}, timeout "
+                f"{report['timeout'] * 1000:g} ms): {report['throughput'] / 1e6:.3f} MB/s, "
+                f"done in {report['completion_time']:.2f} s, "
+                f"{report['retransmissions']} retransmitted, {report['dropped']} dropped"
+                + ("" if correct else ", OUTPUT DIFFERS")
+            )
+    print(
+        f"link: {link.delivered} delivered, {link.dropped} dropped, "
+        f"Jain's fairness index {fairness:.3f}"
+    )
@@ -0,0 +1,165 @@
+# Elizabeth Dorfman
+# Simulation of the Selective Repeat ARQ protocol, a drop in alternative to the Go-Back-N sender and receiver.
+
+import time, threading, heapq
+
+from go_back_n import GBN_sender, GBN_receiver, LazyPackets, DUP_ACK_THRESHOLD, MAX_RTO, CHECKPOINT_BYTES
+
+
+class SR_sender(GBN_sender):
+    # Same constructor and queues as GBN_sender, but every packet has its own timer
+    # and only the packet that timed out is sent again
+    def __init__(self, *args, **kwargs):
+        # Heap of (deadline, sequence #, send time), an entry is stale once its packet is acknowledged or resent
+        self.timer_heap = []
+        super().__init__(*args, **kwargs)
+
+    def send_packet(self, i):
+        super().send_packet(i)
+        sent = self.packet_timers[i]
+        timeout = self.rto
+        if self.adaptive_timeout:
+            # Exponential backoff per packet, each resend of it waits twice as long
+            timeout = min(timeout * 2 ** (self.transmit_counts[i] - 1), MAX_RTO)
+        heapq.heappush(self.timer_heap, (sent + timeout, i, sent))
+
+    def advance_window(self, new_base):
+        try:
+            # called from receive_acks once the base packet is acknowledged
+            # moves the base past every acknowledged packet and sends the packets that entered the window
+            self.base = new_base
+            while self.base < len(self.packets) and self.acks_list[self.base]:
+                self.base += 1
+            self.forget_acknowledged()
+            self.dup_acks = 0
+            end = min(self.base + self.effective_window(), len(self.packets))
+            for i in range(self.next_seq_num, end):
+                self.send_packet(i)
+            self.next_seq_num = max(self.next_seq_num, end)
+        except Exception as e:
+            print(f"Error in SR_sender advance window: {e}.")
+
+    def check_timers(self):
+        try:
+            # called from run
+            # resends each packet whose own timer expired, skipping stale heap entries
+            current_time = time.monotonic()
+            expired = []
+            while self.timer_heap and self.timer_heap[0][0] <= current_time:
+                deadline, i, sent = heapq.heappop(self.timer_heap)
+                if i >= self.base and not self.acks_list[i] and sent == self.packet_timers[i]:
+                    self.logger.info(f"packet {i} timed out")
+                    expired.append(i)
+            if expired:
+                # Backoff is per packet in send_packet, the window shrinks once per burst
+                self.shrink_window(True)
+                for i in expired:
+                    self.send_packet(i)
+        except Exception as e:
+            print(f"Error in SR_sender check timers: {e}.")
+
+    def receive_acks(self):
+        try:
+            # Listens for acknowledgements, each ack covers only its own packet
+            while self.base < len(self.packets):
+                ack = int(self.ack_queue.get())
+                with self.condition:
+                    if self.base <= ack < len(self.packets) and not self.acks_list[ack]:
+                        self.acks_list[ack] = True
+                        self.logger.info(f"ack {ack} received")
+                        self.sample_rtt(ack)
+                        self.grow_window(1)
+                        if ack == self.base:
+                            self.advance_window(ack + 1)
+                        elif self.congestion_control and not self.in_recovery():
+                            # Acks past a missing base packet play the part of duplicate acks
+                            self.dup_acks += 1
+                            if self.dup_acks == DUP_ACK_THRESHOLD:
+                                self.logger.info(f"packet {self.base} fast retransmit")
+                                self.shrink_window(False)
+                                self.send_packet(self.base)
+                        self.condition.notify()
+                    else:
+                        self.logger.info(f"ack {ack} received, Ignoring")
+        except Exception as e:
+            print(f"Error in SR_sender receive acks: {e}.")
+
+    def run(self):
+        try:
+            # Sends the first window then sleeps until the earliest packet deadline
+            # or until an ack arrives, resending only expired packets
+            self.start_time = time.monotonic()
+            with self.condition:
+                self.send_packets()
+            ack_rec = threading.Thread(target=self.receive_acks)
+            ack_rec.start()
+            with self.condition:
+                while self.base < len(self.packets):
+                    self.check_timers()
+                    if self.timer_heap:
+                        self.condition.wait(self.timer_heap[0][0] - time.monotonic())
+                    else:
+                        self.condition.wait()
+
+            self.send_queue.put(None)
+            ack_rec.join()
+            if isinstance(self.packets, LazyPackets):
+                self.packets.close()
+        except Exception as e:
+            print(f"Error in SR_sender run: {e}.")
+
+
+class SR_receiver(GBN_receiver):
+    # Same constructor and queues as GBN_receiver, out of order packets inside the
+    # window are buffered and acknowledged individually instead of discarded.
+    # window_size comes after the shared arguments so positional calls mean the same to both
+    def __init__(
+        self,
+        output_file,
+        send_queue,
+        ack_queue,
+        logger,
+        processing_delay=0,
+        streaming=False,
+        checkpoint_bytes=CHECKPOINT_BYTES,
+        window_size=None,
+    ):
+        super().__init__(
+            output_file, send_queue, ack_queue, logger, processing_delay, streaming, checkpoint_bytes
+        )
+        # None buffers any packet ahead of expected_seq_num
+        self.window_size = window_size
+        # Out of order packets {sequence #: data}
+        self.buffer = {}
+
+    def process_packet(self, packet):
+        try:
+            if self.processing_delay:
+                time.sleep(self.processing_delay)
+            sequence_num, data = self.extract_payload(packet)
+            if sequence_num < self.expected_seq_num:
+                # Its ack was lost, acknowledge it again so the sender moves on
+                self.ack_queue.put(sequence_num)
+                self.logger.info(f"packet {sequence_num} received again")
+                return False
+            if (
+                self.window_size is not None
+                and sequence_num >= self.expected_seq_num + self.window_size
+            ):
+                self.logger.info(f"packet {sequence_num} outside window, discarded")
+                return False
+            self.ack_queue.put(sequence_num)
+            if sequence_num != self.expected_seq_num:
+                self.buffer[sequence_num] = data
+                self.logger.info(f"packet {sequence_num} received out of order, buffered")
+                return False
+            self.deliver(data)
+            self.logger.info(f"packet {sequence_num} received")
+            self.expected_seq_num += 1
+            # Deliver everything the new packet made contiguous
+            while self.expected_seq_num in self.buffer:
+                self.deliver(self.buffer.pop(self.expected_seq_num))
+                self.expected_seq_num += 1
+            return True
+        except Exception as e:
+            print(f"Error in SR receiver process packets: {e}.")
@@ -2,8 +2,11 @@
 #Test for go back n simulation
 #Simulates the Go-Back-N protocol, including packet loss and retransmissions, and logs the results for verification.
 
-from go_back_n import GBN_sender, GBN_receiver
-import threading, queue, logging, time
+from go_back_n import GBN_sender, GBN_receiver, LossyQueue
+from selective_repeat import SR_sender, SR_receiver
+from link import BottleneckLink
+from udp_transport import UDPTransport
+import threading, queue, logging, time, os
 
 log_file = 'simulation.log'
 in_file = 'input_test.txt'
@@ -42,14 +45,112 @@ log_thread.daemon = True  # Set daemon to allow the program to exit even if this
 log_thread.start()
 
 
+def transfer(sender, receiver, input_path, output_path):
+    """Runs the sender in a thread and the receiver until it ends, returns whether the output file matches the input file."""
+    sender_thread = threading.Thread(target=sender.run)
+    sender_thread.start()
+    receiver.run()
+    sender_thread.join()
+    with open(input_path, 'rb') as f1, open(output_path, 'rb') as f2: return f1.read() == f2.read()
+
 send_queue, ack_queue = queue.Queue(), queue.Queue()
 sender = GBN_sender(input_file = in_file, window_size = window_size, packet_len = packet_len, nth_packet = nth_packet, send_queue = send_queue, ack_queue = ack_queue, timeout_interval = timeout_interval, logger = logger)
 receiver = GBN_receiver(output_file = out_file, send_queue = send_queue, ack_queue = ack_queue, logger = logger)
+if transfer(sender, receiver, in_file, out_file): print("Data transmitted successfully!")
+
+# Binary packet format, sending arbitrary bytes read from an open stream
+bin_in_file = 'input_test.bin'
+bin_out_file = 'output_test.bin'
+with open(bin_in_file, 'wb') as f: f.write(bytes(range(256)) * 2)
+
+send_queue, ack_queue = queue.Queue(), queue.Queue()
+with open(bin_in_file, 'rb') as stream:
+    sender = GBN_sender(input_file = stream, window_size = window_size, packet_len = 64, nth_packet = nth_packet, send_queue = send_queue, ack_queue = ack_queue, timeout_interval = timeout_interval, logger = logger, packet_format = "binary")
+receiver = GBN_receiver(output_file = bin_out_file, send_queue = send_queue, ack_queue = ack_queue, logger = logger)
+if transfer(sender, receiver, bin_in_file, bin_out_file): print("Binary data transmitted successfully!")
+
+# Cumulative acks, half of the acks are lost but later acks still move the window
+send_queue, ack_queue = queue.Queue(), LossyQueue(0.5, seed=1)
+sender = GBN_sender(input_file = bin_in_file, window_size = window_size, packet_len = 64, nth_packet = None, send_queue = send_queue, ack_queue = ack_queue, timeout_interval = timeout_interval, logger = logger, packet_format = "binary")
+receiver = GBN_receiver(output_file = bin_out_file, send_queue = send_queue, ack_queue = ack_queue, logger = logger)
+if transfer(sender, receiver, bin_in_file, bin_out_file) and ack_queue.lost > 0: print("Data transmitted successfully with ack loss!")
+
+# Selective Repeat over a lossy link, only the lost packets are sent again
+send_queue, ack_queue = LossyQueue(0.2, seed=2), queue.Queue()
+sender = SR_sender(input_file = bin_in_file, window_size = window_size, packet_len = 64, nth_packet = None, send_queue = send_queue, ack_queue = ack_queue, timeout_interval = timeout_interval, logger = logger, packet_format = "binary")
+receiver = SR_receiver(output_file = bin_out_file, send_queue = send_queue, ack_queue = ack_queue, logger = logger)
+if transfer(sender, receiver, bin_in_file, bin_out_file) and sender.retransmissions == send_queue.lost > 0: print("Selective Repeat data transmitted successfully!")
+
+# Adaptive timeout, the rto follows the measured round trip times instead of timeout_interval
+send_queue, ack_queue = queue.Queue(), queue.Queue()
+sender = GBN_sender(input_file = bin_in_file, window_size = window_size, packet_len = 64, nth_packet = nth_packet, send_queue = send_queue, ack_queue = ack_queue, timeout_interval = timeout_interval, logger = logger, packet_format = "binary", adaptive_timeout = True)
+receiver = GBN_receiver(output_file = bin_out_file, send_queue = send_queue, ack_queue = ack_queue, logger = logger)
+if transfer(sender, receiver, bin_in_file, bin_out_file) and sender.rtt_samples and sender.rto < timeout_interval: print("Data transmitted successfully with adaptive timeout!")
+
+# Congestion control through a bottleneck link, the window grows from one packet
+link = BottleneckLink(bandwidth = 50000, buffer_size = 256)
+send_queue, ack_queue = link.attach(), queue.Queue()
+sender = GBN_sender(input_file = bin_in_file, window_size = 8, packet_len = 64, nth_packet = None, send_queue = send_queue, ack_queue = ack_queue, timeout_interval = timeout_interval, logger = logger, packet_format = "binary", adaptive_timeout = True, congestion_control = True)
+receiver = GBN_receiver(output_file = bin_out_file, send_queue = send_queue, ack_queue = ack_queue, logger = logger)
+if transfer(sender, receiver, bin_in_file, bin_out_file) and sender.cwnd_history[0][1] == 1 and max(cwnd for t, cwnd in sender.cwnd_history) > 1: print("Data transmitted successfully with congestion control!")
+
+# UDP sockets on localhost as the transport, with packets lost by the sending transport
+receiver_transport = UDPTransport()
+sender_transport = UDPTransport(peer_address = receiver_transport.address, loss_rate = 0.2, seed = 3)
+sender = SR_sender(input_file = bin_in_file, window_size = window_size, packet_len = 64, nth_packet = None, send_queue = sender_transport, ack_queue = sender_transport, timeout_interval = timeout_interval, logger = logger, packet_format = "binary", adaptive_timeout = True)
+receiver = SR_receiver(output_file = bin_out_file, send_queue = receiver_transport, ack_queue = receiver_transport, logger = logger)
+cond = transfer(sender, receiver, bin_in_file, bin_out_file)
+sender_transport.close()
+receiver_transport.close()
+if cond and sender_transport.lost > 0: print("Data transmitted successfully over UDP!")
+
+# Link model with a propagation delay each way, every round trip takes at least twice the delay
+send_queue, ack_queue = BottleneckLink(propagation_delay = 0.01).attach(), BottleneckLink(propagation_delay = 0.01).attach()
+sender = GBN_sender(input_file = bin_in_file, window_size = window_size, packet_len = 64, nth_packet = None, send_queue = send_queue, ack_queue = ack_queue, timeout_interval = timeout_interval, logger = logger, packet_format = "binary")
+receiver = GBN_receiver(output_file = bin_out_file, send_queue = send_queue, ack_queue = ack_queue, logger = logger, processing_delay = 0.001)
+if transfer(sender, receiver, bin_in_file, bin_out_file) and min(rtt for t, rtt, rto in sender.rtt_samples) >= 0.02: print("Data transmitted successfully with propagation delay!")
+
+# Streaming receiver, payloads go straight to the output file as they arrive in order
+# 12 data bits per packet so bytes are split across packets
+send_queue, ack_queue = queue.Queue(), queue.Queue()
+sender = GBN_sender(input_file = in_file, window_size = window_size, packet_len = 28, nth_packet = nth_packet, send_queue = send_queue, ack_queue = ack_queue, timeout_interval = timeout_interval, logger = logger)
+receiver = GBN_receiver(output_file = out_file, send_queue = send_queue, ack_queue = ack_queue, logger = logger, streaming = True, checkpoint_bytes = 4)
+if transfer(sender, receiver, in_file, out_file) and receiver.bytes_written == os.path.getsize(in_file) and not receiver.packet_list: print("Data streamed successfully!")
+
+# Streaming Selective Repeat receiver writing into an open binary file
+send_queue, ack_queue = LossyQueue(0.2, seed=4), queue.Queue()
+sender = SR_sender(input_file = bin_in_file, window_size = window_size, packet_len = 64, nth_packet = None, send_queue = send_queue, ack_queue = ack_queue, timeout_interval = timeout_interval, logger = logger, packet_format = "binary")
+with open(bin_out_file, 'wb') as output:
+    receiver = SR_receiver(output_file = output, send_queue = send_queue, ack_queue = ack_queue, logger = logger, streaming = True)
+    cond = transfer(sender, receiver, bin_in_file, bin_out_file)
+if cond and receiver.bytes_written == os.path.getsize(bin_in_file): print("Selective Repeat data streamed successfully!")
+
+# Lazy packets built from the memory mapped input, per packet state only covers the window
+send_queue, ack_queue = queue.Queue(), queue.Queue()
+sender = GBN_sender(input_file = bin_in_file, window_size = window_size, packet_len = 64, nth_packet = nth_packet, send_queue = send_queue, ack_queue = ack_queue, timeout_interval = timeout_interval, logger = logger, packet_format = "binary", lazy = True)
+receiver = GBN_receiver(output_file = bin_out_file, send_queue = send_queue, ack_queue = ack_queue, logger = logger, streaming = True)
+if transfer(sender, receiver, bin_in_file, bin_out_file) and len(sender.packets.cache) <= 2 * window_size and not sender.packet_timers.values: print("Lazy data transmitted successfully!")
 
-sender_thread = threading.Thread(target=sender.run)
-sender_thread.start()
-receiver.run()
-sender_thread.join()
+# Congestion control with lost acks, a cumulative ack after a timeout must not resend packets it acknowledged
+large_in_file = 'input_test_large.bin'
+with open(large_in_file, 'wb') as f: f.write(os.urandom(100000))
+send_queue, ack_queue = BottleneckLink(bandwidth = 200000, buffer_size = 16384, propagation_delay = 0.005).attach(), LossyQueue(0.3, seed=5)
+sender = GBN_sender(input_file = large_in_file, window_size = 32, packet_len = 1024, nth_packet = None, send_queue = send_queue, ack_queue = ack_queue, timeout_interval = 0.03, logger = logger, packet_format = "binary", congestion_control = True, lazy = True)
+receiver = GBN_receiver(output_file = bin_out_file, send_queue = send_queue, ack_queue = ack_queue, logger = logger, streaming = True)
+sent_below_base = []
+send_packet = sender.send_packet
+def send_above_base(i):
+    if i < sender.base: sent_below_base.append(i)
+    send_packet(i)
+sender.send_packet = send_above_base
+cond = transfer(sender, receiver, large_in_file, bin_out_file) and sender.retransmissions > 0 and not sent_below_base
+if cond and not any(state.values for state in (sender.acks_list, sender.packet_timers, sender.dropped, sender.transmit_counts)): print("Data transmitted successfully with congestion control and ack loss!")
 
-with open(in_file, 'r') as f1, open(out_file, 'r') as f2: sent, received = f1.read(), f2.read()
-if sent == received: print("Data transmitted successfully!")
+# Two flows with different windows sharing one bottleneck link
+from multi_flow import run_flows
+flow_out_files = ['output_test_flow0.bin', 'output_test_flow1.bin']
+reports, fairness, link = run_flows(bin_in_file, flow_out_files, windows = [2, 8], timeouts = [timeout_interval], bandwidth = 50000, buffer_size = 512, propagation_delay = 0.005, congestion_control = True, adaptive_timeout = True, packet_bytes = 60)
+cond = 0 < fairness <= 1 and len(reports) == 2
+for out in flow_out_files:
+    with open(bin_in_file, 'rb') as f1, open(out, 'rb') as f2: cond = cond and f1.read() == f2.read()
+if cond: print("Multiple flows transmitted successfully!")
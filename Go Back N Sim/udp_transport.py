@@ -0,0 +1,148 @@
+# Elizabeth Dorfman
+# UDP transport for the ARQ senders and receivers, a queue like stand in for send_queue and ack_queue over real sockets.
+
+import socket, select, struct, queue, random, collections, time
+
+# Type byte at the front of every datagram
+BINARY_PACKET = 0
+BITS_PACKET = 1
+ACK = 2
+END = 3
+END_ACK = 4
+ACK_FORMAT = struct.Struct("!Bq")
+
+# The end marker is the only datagram that has to arrive, it is resent every END_TIMEOUT
+# seconds until the peer acknowledges it, at most END_RETRIES times
+END_TIMEOUT = 0.1
+END_RETRIES = 50
+
+
+class UDPTransport:
+    # One side of a transfer, put sends an item to the peer and get returns the next item
+    # from it, so one transport is both the send_queue and the ack_queue of its side.
+    # Without a peer_address the peer is learned from the first datagram received.
+    # loss_rate drops that fraction of the items put, the end marker is never dropped
+    # and is resent until the peer's transport acknowledges it
+    def __init__(
+        self,
+        local_address=("127.0.0.1", 0),
+        peer_address=None,
+        loss_rate=0,
+        seed=None,
+        buffer_size=4 * 1024 * 1024,
+    ):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, buffer_size)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, buffer_size)
+        self.socket.bind(local_address)
+        self.socket.setblocking(False)
+        self.address = self.socket.getsockname()
+        self.peer_address = peer_address
+        self.loss_rate = loss_rate
+        self.random = random.Random(seed)
+        # Items already read from the socket but not yet returned by get
+        self.received = collections.deque()
+        self.sent = 0
+        self.lost = 0
+        self.batches = 0
+        self.end_received = False
+        self.end_acked = False
+
+    def encode(self, item):
+        if item is None:
+            return bytes([END])
+        if isinstance(item, str):
+            return bytes([BITS_PACKET]) + item.encode("ascii")
+        if isinstance(item, int):
+            return ACK_FORMAT.pack(ACK, item)
+        return bytes([BINARY_PACKET]) + item
+
+    def decode(self, datagram):
+        kind = datagram[0]
+        if kind == END:
+            return None
+        if kind == BITS_PACKET:
+            return datagram[1:].decode("ascii")
+        if kind == ACK:
+            return ACK_FORMAT.unpack(datagram)[1]
+        return datagram[1:]
+
+    def put(self, item, block=True, timeout=None):
+        if item is None:
+            self.send_end()
+            return
+        if self.random.random() < self.loss_rate:
+            self.lost += 1
+            return
+        self.send_datagram(self.encode(item))
+
+    def send_end(self):
+        # Over real UDP a single end marker can be lost, which would leave the receiver
+        # waiting forever, so keep sending it until the END_ACK comes back
+        for _ in range(END_RETRIES):
+            self.send_datagram(self.encode(None))
+            deadline = time.monotonic() + END_TIMEOUT
+            while not self.end_acked:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                select.select([self.socket], [], [], remaining)
+                self.receive_batch()
+            if self.end_acked:
+                return
+
+    def send_datagram(self, datagram, address=None):
+        while True:
+            try:
+                self.socket.sendto(datagram, address or self.peer_address)
+                break
+            except BlockingIOError:
+                # Send buffer full, wait until the kernel has room
+                select.select([], [self.socket], [])
+        self.sent += 1
+
+    def receive_batch(self):
+        # Drains every datagram already waiting in the socket with non blocking reads,
+        # Python has no recvmmsg so this loop is the batch
+        count = 0
+        while True:
+            try:
+                datagram, address = self.socket.recvfrom(65535)
+            except BlockingIOError:
+                break
+            if self.peer_address is None:
+                self.peer_address = address
+            count += 1
+            if datagram[0] == END_ACK:
+                self.end_acked = True
+                continue
+            if datagram[0] == END:
+                # Every copy is acknowledged in case an earlier END_ACK was lost,
+                # only the first one ends the transfer
+                self.send_datagram(bytes([END_ACK]), address)
+                if self.end_received:
+                    continue
+                self.end_received = True
+            self.received.append(self.decode(datagram))
+        if count:
+            self.batches += 1
+
+    def get(self, block=True, timeout=None):
+        # Same contract as queue.Queue.get, raises queue.Empty on timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.received:
+            self.receive_batch()
+            if self.received:
+                break
+            if not block:
+                raise queue.Empty
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise queue.Empty
+            select.select([self.socket], [], [], remaining)
+        return self.received.popleft()
+
+    def close(self):
+        self.socket.close()
@@ -0,0 +1,161 @@
+# Elizabeth Dorfman
+#HTTP server that handles every connection on one asyncio event loop instead of a thread each.
+
+import asyncio
+import os
+import time
+from socket import IPPROTO_TCP, TCP_NODELAY
+
+from request_parser import RequestParser, RequestError
+from server import Server, LINGER_TIMEOUT
+
+
+class StreamSocket:
+    # Gives an asyncio stream the parts of the socket interface the request handlers use,
+    # so the GET and POST routing in Server is shared by both engines
+    def __init__(self, writer):
+        self.writer = writer
+        # Files to send and any data queued behind them, in order, until flush
+        self.pending = []
+
+    def sendall(self, data):
+        # Buffered by the transport, handle_connection drains it after the handler returns
+        if self.pending:
+            self.pending.append(data)
+        else:
+            self.writer.write(data)
+
+    def sendfile(self, file, offset=0, count=None):
+        # The handler closes its file when it returns, so keep a duplicate of the descriptor
+        # for loop.sendfile to read from once flush runs
+        duplicate = os.fdopen(os.dup(file.fileno()), "rb")
+        self.pending.append((duplicate, offset, count))
+
+    def getpeername(self):
+        return self.writer.get_extra_info("peername")
+
+    def close(self):
+        # Files a broken connection never got to send are closed with it
+        for item in self.pending:
+            if isinstance(item, tuple):
+                item[0].close()
+        self.pending = []
+        self.writer.close()
+
+    async def flush(self):
+        # Waits for everything the handler sent, files go through os.sendfile on the loop
+        await self.writer.drain()
+        loop = asyncio.get_running_loop()
+        while self.pending:
+            item = self.pending.pop(0)
+            if isinstance(item, tuple):
+                file, offset, count = item
+                with file:
+                    await loop.sendfile(self.writer.transport, file, offset, count)
+            else:
+                self.writer.write(item)
+                await self.writer.drain()
+
+
+class AsyncServer(Server):
+    def __init__(self, *args, **kwargs):
+        # Same arguments as Server
+        super().__init__(*args, **kwargs)
+        self.loop = None
+        self.stopped = None
+
+    def start_server(self):
+        # Runs the event loop until stop_server is called or timeout seconds pass without a request
+        asyncio.run(self.serve())
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        # The socket is already bound, asyncio makes it non blocking and calls listen again,
+        # so the backlog has to be passed or its default of 100 replaces the configured one
+        server = await asyncio.start_server(
+            self.handle_connection, sock=self.server_socket, backlog=self.backlog
+        )
+        async with server:
+            while self.server_on:
+                # Sleep until the idle deadline instead of polling, a connection moves it forward
+                remaining = self.last_connection_time + self.timeout - time.time()
+                if remaining <= 0:
+                    print(
+                        f"Server timed out– {self.timeout} second timeout period has passed."
+                    )
+                    break
+                try:
+                    await asyncio.wait_for(self.stopped.wait(), remaining)
+                    break
+                except asyncio.TimeoutError:
+                    pass
+        super().stop_server()
+
+    def stop_server(self):
+        # Safe to call from any thread, the loop itself closes the socket when it sees the event
+        if self.loop is None or self.loop.is_closed():
+            super().stop_server()
+            return
+        self.server_on = False
+        self.loop.call_soon_threadsafe(self.stopped.set)
+
+    async def handle_connection(self, reader, writer):
+        self.last_connection_time = time.time()
+        print(
+            f"Connection from {writer.get_extra_info('peername')} at {self.last_connection_time}."
+        )
+        # asyncio only disables Nagle itself when the listening socket was made with IPPROTO_TCP
+        writer.get_extra_info("socket").setsockopt(IPPROTO_TCP, TCP_NODELAY, 1)
+        client_socket = StreamSocket(writer)
+        parser = RequestParser(self.max_header_bytes, self.max_body_bytes)
+        handled = 0
+        linger = False
+        # Same keep alive loop as Server.handle_request
+        try:
+            while handled < self.max_requests:
+                request = parser.next_request()
+                if request is None:
+                    # Receive the HTTP request data
+                    received = await asyncio.wait_for(reader.read(65536), self.idle_timeout)
+                    # Client closed the connection
+                    if not received:
+                        break
+                    parser.feed(received)
+                    # Requests on a kept alive connection also hold off the server timeout
+                    self.last_connection_time = time.time()
+                    continue
+                handled += 1
+                keep_alive = self.respond(client_socket, request, handled == self.max_requests)
+                await client_socket.flush()
+                if not keep_alive:
+                    linger = True
+                    break
+        except RequestError as e:
+            self.handle_bad_request(client_socket, e)
+            await client_socket.flush()
+            linger = True
+        except asyncio.TimeoutError:
+            pass
+        except ConnectionError as e:
+            print(f"Connection closed by client: {e}.")
+        finally:
+            try:
+                if linger:
+                    await self.linger(reader, writer)
+            finally:
+                # Close the socket
+                client_socket.close()
+
+    async def linger(self, reader, writer):
+        # Same as Server.close_connection, stop sending and read off what the client still sends
+        # so unread pipelined requests do not turn the close into a reset
+        try:
+            writer.write_eof()
+            deadline = time.monotonic() + LINGER_TIMEOUT
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not await asyncio.wait_for(reader.read(65536), remaining):
+                    break
+        except (asyncio.TimeoutError, OSError):
+            pass
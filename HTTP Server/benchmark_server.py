@@ -0,0 +1,196 @@
+#Elizabeth Dorfman
+#Load test comparing requests per second and latency of the threaded and asyncio servers.
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from async_server import AsyncServer
+from file_cache import CACHE_BYTES
+from server import Server
+
+ENGINES = {"threaded": Server, "asyncio": AsyncServer}
+
+PAGE = "<html><body><h1>Hello {{name}}</h1></body></html>"
+
+
+def run_server(engine, addr, port, backlog, cache_bytes, directory, ready):
+    # Server process, its per request prints go nowhere so they do not slow the run
+    sys.stdout = open(os.devnull, "w")
+    os.chdir(directory)
+    server = ENGINES[engine](addr, port, 5, backlog, cache_bytes=cache_bytes)
+    ready.set()
+    server.start_server()
+
+
+async def read_response(reader):
+    # One response, framed by its Content-Length so the connection can be reused
+    head = await reader.readuntil(b"\r\n\r\n")
+    length = 0
+    for line in head.split(b"\r\n"):
+        name, _, value = line.partition(b":")
+        if name.lower() == b"content-length":
+            length = int(value)
+    return head + await reader.readexactly(length)
+
+
+async def read_responses(reader, count):
+    return [await read_response(reader) for _ in range(count)]
+
+
+def build_request(addr, mode, upload_size):
+    # A small GET, a GET of the static download file, or for the upload modes a form POST
+    # carrying upload_size bytes of data
+    if mode == "download":
+        return f"GET /assets/download.bin HTTP/1.1\r\nHost: {addr}\r\n\r\n".encode()
+    if mode in ("close", "keep-alive"):
+        request = f"GET / HTTP/1.1\r\nHost: {addr}\r\n".encode()
+        if mode == "close":
+            request += b"Connection: close\r\n"
+        return request + b"\r\n"
+    body = b"name=bench&data=" + b"x" * upload_size
+    request = f"POST /change_name HTTP/1.1\r\nHost: {addr}\r\n".encode()
+    if mode == "upload":
+        return request + b"Content-Length: %d\r\n\r\n" % len(body) + body
+    request += b"Transfer-Encoding: chunked\r\n\r\n"
+    for i in range(0, len(body), 65536):
+        chunk = body[i : i + 65536]
+        request += b"%x\r\n" % len(chunk) + chunk + b"\r\n"
+    return request + b"0\r\n\r\n"
+
+
+async def client(addr, port, requests, mode, pipeline, upload_size, timeout, latencies, failures):
+    # One simulated user. In close mode every request opens a new connection and asks the
+    # server to close it, in the other modes all of them share one connection and go
+    # pipeline at a time without waiting for the answers in between.
+    # A request that takes longer than timeout counts as failed
+    request = build_request(addr, mode, upload_size)
+    connection = None
+    sent = 0
+    while sent < requests:
+        batch = 1 if mode == "close" else min(pipeline, requests - sent)
+        sent += batch
+        start = time.perf_counter()
+        try:
+            if connection is None:
+                connection = await asyncio.wait_for(asyncio.open_connection(addr, port), timeout)
+            reader, writer = connection
+            writer.write(request * batch)
+            responses = await asyncio.wait_for(read_responses(reader, batch), timeout)
+        except (OSError, EOFError, asyncio.TimeoutError) as e:
+            failures.extend([e] * batch)
+            if connection is not None:
+                connection[1].close()
+                connection = None
+            continue
+        elapsed = time.perf_counter() - start
+        for response in responses:
+            if response.startswith(b"HTTP/1.1 200"):
+                latencies.append(elapsed)
+            else:
+                failures.append(response[:40])
+        if mode == "close":
+            writer.close()
+            connection = None
+    if connection is not None:
+        connection[1].close()
+
+
+async def load(addr, port, concurrency, requests, mode, pipeline, upload_size, timeout):
+    latencies, failures = [], []
+    start = time.perf_counter()
+    clients = [
+        client(addr, port, requests, mode, pipeline, upload_size, timeout, latencies, failures)
+        for _ in range(concurrency)
+    ]
+    await asyncio.gather(*clients)
+    return time.perf_counter() - start, latencies, failures
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def benchmark(
+    engine, addr, port, backlog, cache_bytes, concurrency, requests, mode, pipeline,
+    upload_size, timeout, directory,
+):
+    ready = multiprocessing.Event()
+    process = multiprocessing.Process(
+        target=run_server, args=(engine, addr, port, backlog, cache_bytes, directory, ready)
+    )
+    process.start()
+    # A server that cannot bind, say to a port still in TIME_WAIT, exits without setting ready
+    while not ready.wait(0.1):
+        if not process.is_alive():
+            raise RuntimeError(f"{engine} server did not start on port {port}")
+    elapsed, latencies, failures = asyncio.run(
+        load(addr, port, concurrency, requests, mode, pipeline, upload_size, timeout)
+    )
+    process.terminate()
+    process.join()
+    uploaded = ""
+    if mode == "download":
+        uploaded = f" ({len(latencies) * upload_size / 1e6 / elapsed:.1f} MB/s downloaded)"
+    elif mode not in ("close", "keep-alive"):
+        uploaded = f" ({len(latencies) * upload_size / 1e6 / elapsed:.1f} MB/s uploaded)"
+    print(
+        f"{engine} {mode}{'' if cache_bytes else ' uncached'}: {len(latencies) / elapsed:.0f} requests/s{uploaded}, "
+        f"p50 {percentile(latencies, 0.5) * 1000:.1f} ms, "
+        f"p99 {percentile(latencies, 0.99) * 1000:.1f} ms, {len(failures)} failed"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the HTTP server engines")
+    parser.add_argument("--engines", nargs="+", choices=sorted(ENGINES), default=sorted(ENGINES))
+    parser.add_argument("--addr", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--backlog", type=int, default=1024, help="listen backlog for both engines")
+    parser.add_argument(
+        "--cache-bytes", type=int, default=CACHE_BYTES, help="server file cache size, 0 turns it off"
+    )
+    parser.add_argument(
+        "--page-size", type=int, default=0, help="pad the served page to about this many bytes"
+    )
+    parser.add_argument("--concurrency", type=int, default=200, help="simultaneous clients")
+    parser.add_argument("--requests", type=int, default=20, help="requests each client sends")
+    parser.add_argument(
+        "--modes",
+        nargs="+",
+        choices=["close", "keep-alive", "upload", "chunked-upload", "download"],
+        default=["close", "keep-alive"],
+        help="GETs on a new connection each or one kept alive connection per client, "
+        "form POSTs with a Content-Length or chunked body, or GETs of a static binary file",
+    )
+    parser.add_argument(
+        "--upload-size", type=int, default=1000000, help="data bytes in each upload or download"
+    )
+    parser.add_argument(
+        "--pipeline", type=int, default=1, help="requests sent at once on a kept alive connection"
+    )
+    parser.add_argument("--timeout", type=float, default=10, help="seconds before a request fails")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.mkdir(os.path.join(directory, "assets"))
+        with open(os.path.join(directory, "assets", "index.html"), "w") as file:
+            file.write(PAGE.replace("</body>", "x" * (args.page_size - len(PAGE)) + "</body>"))
+        with open(os.path.join(directory, "assets", "download.bin"), "wb") as file:
+            file.write(os.urandom(args.upload_size))
+        port = args.port
+        for engine in args.engines:
+            for mode in args.modes:
+                # A fresh port each time so the last run's sockets in TIME_WAIT do not get in the way
+                benchmark(
+                    engine, args.addr, port, args.backlog, args.cache_bytes, args.concurrency,
+                    args.requests, mode, args.pipeline, args.upload_size, args.timeout, directory,
+                )
+                port += 1
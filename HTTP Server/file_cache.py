@@ -0,0 +1,66 @@
+# Elizabeth Dorfman
+# In-memory cache of served files, each kept as a template of bytes pre-split on {{name}}.
+
+import collections
+import os
+import threading
+
+CACHE_BYTES = 32 * 1024 * 1024
+PLACEHOLDER = b"{{name}}"
+
+
+class CachedFile:
+    def __init__(self, data, version):
+        # The file's bytes split around each {{name}}, kept encoded so rendering is one join
+        # with no scan of the text and no encoding of the page per request
+        self.fragments = data.split(PLACEHOLDER)
+        # What identifies this copy of the file on disk, a change to any of them invalidates it
+        self.version = version
+        self.size = sum(len(fragment) for fragment in self.fragments)
+
+    def render(self, name):
+        # The page as bytes ready to send
+        return name.encode("utf-8").join(self.fragments)
+
+
+class FileCache:
+    # Keyed by path and bounded by max_bytes, the least recently used files are evicted first.
+    # Every lookup stats the file so an edited or replaced file is read again.
+    # A file bigger than max_bytes is still returned, just not kept, and max_bytes 0 turns caching off
+    def __init__(self, max_bytes=CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.files = collections.OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Shared by every connection thread of the threaded server
+        self.lock = threading.Lock()
+
+    def get(self, path):
+        # Raises OSError when the file cannot be read
+        stat = os.stat(path)
+        version = (stat.st_mtime_ns, stat.st_ino, stat.st_size)
+        with self.lock:
+            cached = self.files.get(path)
+            if cached is not None and cached.version == version:
+                self.hits += 1
+                self.files.move_to_end(path)
+                return cached
+            self.misses += 1
+        with open(path, "rb") as file:
+            cached = CachedFile(file.read(), version)
+        with self.lock:
+            self.remove(path)
+            if cached.size <= self.max_bytes:
+                self.files[path] = cached
+                self.total_bytes += cached.size
+                while self.total_bytes > self.max_bytes:
+                    self.remove(next(iter(self.files)))
+                    self.evictions += 1
+        return cached
+
+    def remove(self, path):
+        cached = self.files.pop(path, None)
+        if cached is not None:
+            self.total_bytes -= cached.size
@@ -0,0 +1,205 @@
+# Elizabeth Dorfman
+# Incremental HTTP/1.1 request parser, fed bytes as they arrive and handing back complete requests in order.
+
+import collections
+
+MAX_HEADER_BYTES = 8192
+MAX_BODY_BYTES = 10 * 1024 * 1024
+
+
+class RequestError(Exception):
+    # A request the server refuses, status is the status line to answer with before closing
+    def __init__(self, status, reason):
+        super().__init__(reason)
+        self.status = status
+
+
+class Request:
+    def __init__(self, request_line, method, path, version, headers, body):
+        self.request_line = request_line
+        self.method = method
+        self.path = path
+        self.version = version
+        self.headers = headers
+        self.body = body
+
+
+class RequestParser:
+    # One per connection. feed takes whatever the socket returned, next_request returns the
+    # requests completed so far and raises RequestError once it reaches a bad one.
+    # A Content-Length body goes into a bytearray of exactly that size, body_space exposes
+    # its unfilled part so a blocking socket can recv_into it without an extra copy
+    def __init__(self, max_header_bytes=MAX_HEADER_BYTES, max_body_bytes=MAX_BODY_BYTES):
+        self.max_header_bytes = max_header_bytes
+        self.max_body_bytes = max_body_bytes
+        # Bytes received but not parsed yet
+        self.buffer = bytearray()
+        # Where to resume looking for the end of the headers
+        self.search_start = 0
+        self.requests = collections.deque()
+        self.error = None
+        self.state = "headers"
+        self.request = None
+        self.body = None
+        self.filled = 0
+        self.chunk_left = 0
+
+    def next_request(self):
+        if self.requests:
+            return self.requests.popleft()
+        if self.error is not None:
+            raise self.error
+        return None
+
+    def body_space(self):
+        # Unfilled part of the current Content-Length body, None in any other state
+        if self.state != "body" or self.buffer:
+            return None
+        return memoryview(self.body)[self.filled :]
+
+    def body_received(self, count):
+        # count bytes were written into body_space
+        self.filled += count
+        if self.filled == len(self.body):
+            self.finish()
+            self.parse()
+
+    def feed(self, data):
+        self.buffer += data
+        self.parse()
+
+    def parse(self):
+        # Consumes as much of the buffer as is complete, stops at the first error
+        try:
+            while self.error is None:
+                if self.state == "headers":
+                    done = self.parse_headers()
+                elif self.state == "body":
+                    done = self.parse_body()
+                elif self.state == "chunk_size":
+                    done = self.parse_chunk_size()
+                elif self.state == "chunk":
+                    done = self.parse_chunk()
+                else:
+                    done = self.parse_trailers()
+                if not done:
+                    return
+        except RequestError as e:
+            self.error = e
+
+    def parse_headers(self):
+        end = self.buffer.find(b"\r\n\r\n", self.search_start)
+        if end == -1:
+            if len(self.buffer) > self.max_header_bytes:
+                raise RequestError("431 Request Header Fields Too Large", "headers too large")
+            self.search_start = max(0, len(self.buffer) - 3)
+            return False
+        if end > self.max_header_bytes:
+            raise RequestError("431 Request Header Fields Too Large", "headers too large")
+        lines = self.buffer[:end].decode("utf-8", "replace").split("\r\n")
+        del self.buffer[: end + 4]
+        self.search_start = 0
+
+        request_line = lines[0]
+        try:
+            method, path, version = request_line.split(" ")
+        except ValueError:
+            raise RequestError("400 Bad Request", f"malformed request line {request_line!r}")
+        headers = {}
+        for line in lines[1:]:
+            key, colon, value = line.partition(":")
+            if not colon:
+                raise RequestError("400 Bad Request", f"malformed header {line!r}")
+            headers[key.strip()] = value.strip()
+        self.request = Request(request_line, method, path, version, headers, b"")
+
+        lowered = {key.lower(): value for key, value in headers.items()}
+        encoding = lowered.get("transfer-encoding", "").lower()
+        if encoding:
+            if encoding != "chunked":
+                raise RequestError("501 Not Implemented", f"transfer encoding {encoding}")
+            self.body = bytearray()
+            self.state = "chunk_size"
+            return True
+        try:
+            length = int(lowered.get("content-length", 0))
+        except ValueError:
+            raise RequestError("400 Bad Request", "malformed Content-Length")
+        if length < 0:
+            raise RequestError("400 Bad Request", "negative Content-Length")
+        if length > self.max_body_bytes:
+            raise RequestError("413 Payload Too Large", f"{length} byte body")
+        if length == 0:
+            self.finish()
+            return True
+        self.body = bytearray(length)
+        self.filled = 0
+        self.state = "body"
+        return True
+
+    def parse_body(self):
+        count = min(len(self.body) - self.filled, len(self.buffer))
+        memoryview(self.body)[self.filled : self.filled + count] = self.buffer[:count]
+        del self.buffer[:count]
+        self.filled += count
+        if self.filled < len(self.body):
+            return False
+        self.finish()
+        return True
+
+    def read_line(self):
+        # Next \r\n terminated line of a chunked body, None until it has all arrived
+        end = self.buffer.find(b"\r\n")
+        if end == -1:
+            if len(self.buffer) > self.max_header_bytes:
+                raise RequestError("400 Bad Request", "chunk line too long")
+            return None
+        line = bytes(self.buffer[:end])
+        del self.buffer[: end + 2]
+        return line
+
+    def parse_chunk_size(self):
+        line = self.read_line()
+        if line is None:
+            return False
+        try:
+            # Chunk extensions after ; are allowed and ignored
+            size = int(line.split(b";")[0], 16)
+        except ValueError:
+            raise RequestError("400 Bad Request", "malformed chunk size")
+        if size < 0:
+            raise RequestError("400 Bad Request", "negative chunk size")
+        if len(self.body) + size > self.max_body_bytes:
+            raise RequestError("413 Payload Too Large", "chunked body too large")
+        self.chunk_left = size
+        self.state = "chunk" if size else "trailers"
+        return True
+
+    def parse_chunk(self):
+        # Chunk data then its \r\n
+        if len(self.buffer) < self.chunk_left + 2:
+            return False
+        if self.buffer[self.chunk_left : self.chunk_left + 2] != b"\r\n":
+            raise RequestError("400 Bad Request", "chunk not followed by CRLF")
+        self.body += self.buffer[: self.chunk_left]
+        del self.buffer[: self.chunk_left + 2]
+        self.state = "chunk_size"
+        return True
+
+    def parse_trailers(self):
+        # Trailer fields are read and dropped, a blank line ends the request
+        line = self.read_line()
+        if line is None:
+            return False
+        if line == b"":
+            self.finish()
+        return True
+
+    def finish(self):
+        if self.body is not None:
+            self.request.body = self.body
+        self.requests.append(self.request)
+        self.request = None
+        self.body = None
+        self.filled = 0
+        self.state = "headers"
@@ -6,35 +6,76 @@ from socket import *
 import threading
 import time
 import os
+import mimetypes
 import urllib.parse
 
+from file_cache import FileCache, CACHE_BYTES
+from request_parser import RequestParser, RequestError, MAX_HEADER_BYTES, MAX_BODY_BYTES
+
+# Seconds a closing connection keeps reading what the client still sends
+LINGER_TIMEOUT = 1
+
 
 class Server:
-    def __init__(self, addr, port, timeout):
+    def __init__(
+        self,
+        addr,
+        port,
+        timeout,
+        backlog=5,
+        idle_timeout=5,
+        max_requests=100,
+        max_header_bytes=MAX_HEADER_BYTES,
+        max_body_bytes=MAX_BODY_BYTES,
+        cache_bytes=CACHE_BYTES,
+    ):
         # Initialize instance varaiables
         self.addr = addr
         self.port = port
         self.timeout = timeout
+        self.backlog = backlog
+        # A kept alive connection is closed after idle_timeout seconds without a request
+        # or once it has carried max_requests requests
+        self.idle_timeout = idle_timeout
+        self.max_requests = max_requests
+        # Larger requests are refused with 431 or 413
+        self.max_header_bytes = max_header_bytes
+        self.max_body_bytes = max_body_bytes
+        # Served files stay in memory up to cache_bytes, 0 reads them from disk every time
+        self.cache = FileCache(cache_bytes)
         self.sessions = {}
         self.server_socket = socket(AF_INET, SOCK_STREAM)
 
         # Bind server socket to address port to listen on
         self.server_socket.bind((addr, port))
-        self.server_socket.listen(5)
+        # Backlog is how many connections the kernel queues before accept, the rest are dropped
+        self.server_socket.listen(backlog)
 
         # Set timeout
         self.server_socket.settimeout(self.timeout)
 
         # Track server connections
         self.server_on = True
+        # Connections and requests on kept alive connections both hold off the timeout
+        self.last_connection_time = time.time()
         print(
             f"Server started on {self.addr}:{self.port} with a timeout of {self.timeout} seconds."
         )
 
     def start_server(self):
-        # Run server indefinitely
+        # Run server until stop_server is called or timeout seconds pass without a connection or request
         while self.server_on:
+            # Wait for a connection only until the idle deadline, requests on kept alive
+            # connections move it forward while accept waits
+            remaining = self.last_connection_time + self.timeout - time.time()
+            if remaining <= 0:
+                print(
+                    f"Server timed out– {self.timeout} second timeout period has passed."
+                )
+                self.stop_server()
+                break
             try:
+                self.server_socket.settimeout(remaining)
                 connection, client_address = (
                     self.server_socket.accept()
                 )  # Waits for a client to connect
@@ -48,11 +89,13 @@ class Server:
                     target=self.handle_request, args=(connection,)
                 )  # Handles connection in new thread
                 thread.start()  # Executes thread
-            except timeout:  # Handles timeout exception
-                print(
-                    f"Server timed out– {self.timeout} second timeout period has passed."
-                )
-                self.stop_server()
+            except timeout:  # Deadline reached, checked again at the top of the loop
+                pass
+            except OSError:
+                # stop_server closed the socket from another thread
+                if self.server_on:
+                    raise
+                break
 
     def stop_server(self):
         # Stop the server and close the socket.
@@ -61,81 +104,153 @@ class Server:
         self.server_socket.close()
 
     def parse_request(self, request_data):
-        # Decode from bytes into string
-        data = request_data.decode("utf-8")
-        # parsing the raw HTTP request data request_data into request line, headers, and body by splitting it using the delimiter (\r\n)
-        lines = data.split("\r\n")
-        # The first line, known as the request line, contains the HTTP method, the requested path, and the HTTP version.
-        request_line = lines[0]
-
-        # Initialize headers and body
-        headers = {}
-        body = ""
-
-        # For tracking whether collecting body lines
-        in_body = False
-
-        # Iterate through each line
-        for line in lines[1:]:
-            if line == "" or in_body == True:
-                in_body = True
-                body += line
-            else:
-                header = line.split(":", 1)
-                key = header[0].strip()  # Strip any extra whitespace
-                value = header[1].strip()  # Strip any extra whitespace
-                headers[key] = value
-        # The method returns the request line, headers, and body.
-        return request_line, headers, body
+        # Parses one complete request held in request_data and returns its request line, headers and body
+        parser = RequestParser(self.max_header_bytes, self.max_body_bytes)
+        parser.feed(request_data)
+        request = parser.next_request()
+        if request is None:
+            raise RequestError("400 Bad Request", "incomplete request")
+        return request.request_line, request.headers, bytes(request.body).decode("utf-8", "replace")
 
     def handle_request(self, client_socket):
-        # Receive the HTTP request data
-        data = client_socket.recv(1024)
+        # Answer requests on the same connection until the client closes it or asks to,
+        # it stays idle too long, or it reaches max_requests. Pipelined requests wait
+        # in the parser and are answered in order
+        client_socket.settimeout(self.idle_timeout)
+        # Send each response right away, otherwise Nagle holds back the answers to
+        # pipelined requests until the client's delayed ack
+        client_socket.setsockopt(IPPROTO_TCP, TCP_NODELAY, 1)
+        parser = RequestParser(self.max_header_bytes, self.max_body_bytes)
+        handled = 0
+        # Set when the server, not the client, ends the connection
+        linger = False
+        try:
+            while handled < self.max_requests:
+                request = parser.next_request()
+                if request is None:
+                    # Receive the HTTP request data, a Content-Length body straight into its buffer
+                    space = parser.body_space()
+                    if space is not None:
+                        count = client_socket.recv_into(space)
+                        # Client closed the connection
+                        if not count:
+                            break
+                        parser.body_received(count)
+                    else:
+                        received = client_socket.recv(65536)
+                        # Client closed the connection
+                        if not received:
+                            break
+                        parser.feed(received)
+                    # Requests on a kept alive connection also hold off the server timeout
+                    self.last_connection_time = time.time()
+                    continue
+                handled += 1
+                if not self.respond(client_socket, request, handled == self.max_requests):
+                    linger = True
+                    break
+        except RequestError as e:
+            self.handle_bad_request(client_socket, e)
+            linger = True
+        # Idle timeout or connection reset by the client
+        except OSError:
+            pass
 
-        # Check if empty test request and close socket
-        if not data:
-            client_socket.close()
-            return
+        # Close the socket
+        self.close_connection(client_socket, linger)
+
+    def close_connection(self, client_socket, linger):
+        # With linger, stop sending and read whatever the client still sends for a moment before
+        # closing. Closing with requests it already pipelined unread makes the kernel reset the
+        # connection, which can destroy the last response before the client has read it
+        if linger:
+            try:
+                client_socket.shutdown(SHUT_WR)
+                deadline = time.monotonic() + LINGER_TIMEOUT
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    client_socket.settimeout(remaining)
+                    if not client_socket.recv(65536):
+                        break
+            except OSError:
+                pass
+        client_socket.close()
 
+    def keep_alive(self, version, headers):
+        # HTTP/1.1 connections stay open unless the client sends Connection: close,
+        # HTTP/1.0 ones only when it sends Connection: keep-alive
+        connection = ""
+        for key, value in headers.items():
+            if key.lower() == "connection":
+                connection = value.lower()
+        if version == "HTTP/1.1":
+            return connection != "close"
+        return connection == "keep-alive"
+
+    def respond(self, client_socket, request, last=False):
+        # Routes one parsed request and sends its response, client_socket only needs sendall, sendfile and getpeername.
+        # last marks the final request the connection may carry. Returns whether the connection
+        # can carry another request, the response says so in its Connection header
         # Extract request details
-        request_line, headers, body = self.parse_request(data)
-        try:
-            method, path, version = request_line.split(" ")
-        except:
-            print(f"Malformed request line: {request_line}")
-            method = "Invalid request"
+        method, path, version = request.method, request.path, request.version
+        headers = request.headers
+        body = bytes(request.body).decode("utf-8", "replace")
+        keep_alive = self.keep_alive(version, headers) and not last
+        if not keep_alive:
+            connection = "Connection: close\r\n"
+        elif version != "HTTP/1.1":
+            # HTTP/1.0 clients only reuse the connection when the response confirms it
+            connection = "Connection: keep-alive\r\n"
+        else:
+            connection = ""
         # Serve default page
         if path == "/" or not path:
             path = "assets/index.html"
 
         # Handle GET method
         if method == "GET":
-            self.handle_get_request(client_socket, path)
+            self.handle_get_request(client_socket, path, headers, connection)
         # Handle POST method
         elif method == "POST":
-            self.handle_post_request(client_socket, path, headers, body)
+            self.handle_post_request(client_socket, path, headers, body, connection)
         # Handle unsupported method
         else:
             print("Called unsupported request")
-            self.handle_unsupported_method(client_socket, method)
+            self.handle_unsupported_method(client_socket, method, connection)
+        return keep_alive
 
-        # Close the socket
-        client_socket.close()
+    def handle_bad_request(self, client_socket, error):
+        # Answers a request the parser refused, the connection is closed after it
+        print(f"Bad request: {error}")
+        content = f"<html><body><h1>{error.status}</h1></body></html>"
+        response_headers = (
+            f"HTTP/1.1 {error.status}\r\n"
+            f"Content-Length: {len(content)}\r\n"
+            "Content-Type: text/html\r\n"
+            "Connection: close\r\n"
+            "\r\n"
+        )
+        # Send response back to socket
+        response = response_headers + content
+        client_socket.sendall(response.encode("utf-8"))
 
-    def handle_unsupported_method(self, client_socket, method):
+    def handle_unsupported_method(self, client_socket, method, connection=""):
         # Create 405 page with unsupported method
         content = "<html><body><h1>405 Method Not Allowed</h1></body></html>"
         response_headers = (
             "HTTP/1.1 405 Method Not Allowed\r\n"
             f"Content-Length: {len(content)}\r\n"
             "Content-Type: text/html\r\n"
+            f"{connection}"
             "\r\n"
         )
         # Send response back to socket
         response = response_headers + content
         client_socket.sendall(response.encode("utf-8"))
 
-    def handle_get_request(self, client_socket, file_path):
+    def handle_get_request(self, client_socket, file_path, headers=None, connection=""):
         # Retrieve client's name
         client_ip, client_port = client_socket.getpeername()
         print(f"Handling GET request to path {file_path}")
@@ -143,39 +258,119 @@ class Server:
             client_name = self.sessions[client_ip]
         except:
             client_name = ""
+        # Remove leading /
+        file_path = file_path.lstrip("/")
+        content_type = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+        # Only html pages are templates, every other file is sent as it is on disk
+        if content_type != "text/html":
+            self.handle_static_file(client_socket, file_path, content_type, headers or {}, connection)
+            return
         # Create http response to get file
         try:
-            # Check if path exists
-            os.path.exists(file_path)
-            # Remove leading /
-            file_path = file_path.lstrip("/")
-            # Read file content and replace name
-            with open(file_path, "r") as file:
-                content = file.read()
-                content = content.replace("{{name}}", client_name)
-                # Create an http response header
-                response_headers = (
-                    "HTTP/1.1 200 OK\r\n"
-                    f"Content-Length: {len(content)}\r\n"
-                    "Content-Type: text/html\r\n"
-                    "\r\n"
-                )
+            # Cached file content with the name filled in
+            content = self.cache.get(file_path).render(client_name)
         # 404 Exception if error opening file
         except:
-            # Create 404 page with response headers
-            content = "<html><body><h1>404 Not Found</h1></body></html>"
-            response_headers = (
-                "HTTP/1.1 404 Not Found\r\n"
-                f"Content-Length: {len(content)}\r\n"
-                "Content-Type: text/html\r\n"
-                "\r\n"
-            )
+            self.handle_not_found(client_socket, connection)
+            return
+        # Create an http response header, the length counts bytes not characters
+        response_headers = (
+            "HTTP/1.1 200 OK\r\n"
+            f"Content-Length: {len(content)}\r\n"
+            "Content-Type: text/html\r\n"
+            f"{connection}"
+            "\r\n"
+        )
+        # Send response back to socket
+        client_socket.sendall(response_headers.encode("utf-8") + content)
 
+    def handle_not_found(self, client_socket, connection=""):
+        # Create 404 page with response headers
+        content = "<html><body><h1>404 Not Found</h1></body></html>"
+        response_headers = (
+            "HTTP/1.1 404 Not Found\r\n"
+            f"Content-Length: {len(content)}\r\n"
+            "Content-Type: text/html\r\n"
+            f"{connection}"
+            "\r\n"
+        )
         # Send response back to socket
         response = response_headers + content
         client_socket.sendall(response.encode("utf-8"))
 
-    def handle_post_request(self, client_socket, path, headers, body):
+    def parse_range(self, value, size):
+        # First and last byte of a single range (bytes=0-499, bytes=500- or bytes=-500),
+        # None when the header should be ignored and the whole file sent, False when no byte
+        # of the file is in the range
+        unit, _, spec = value.strip().partition("=")
+        if unit.strip() != "bytes" or "," in spec:
+            return None
+        first, dash, last = spec.strip().partition("-")
+        if not dash:
+            return None
+        try:
+            if not first:
+                suffix = int(last)
+                if suffix <= 0 or size == 0:
+                    return False
+                return max(0, size - suffix), size - 1
+            start = int(first)
+            end = int(last) if last else size - 1
+        except ValueError:
+            return None
+        if start >= size:
+            return False
+        if end < start:
+            return None
+        return start, min(end, size - 1)
+
+    def handle_static_file(self, client_socket, file_path, content_type, headers, connection=""):
+        # Sends the file with socket.sendfile so the kernel copies it straight from the page
+        # cache to the socket, a Range header gets just that part as 206 Partial Content
+        try:
+            file = open(file_path, "rb")
+        except OSError:
+            self.handle_not_found(client_socket, connection)
+            return
+        with file:
+            size = os.fstat(file.fileno()).st_size
+            byte_range = None
+            for key, value in headers.items():
+                if key.lower() == "range":
+                    byte_range = self.parse_range(value, size)
+            if byte_range is False:
+                response_headers = (
+                    "HTTP/1.1 416 Range Not Satisfiable\r\n"
+                    f"Content-Range: bytes */{size}\r\n"
+                    "Content-Length: 0\r\n"
+                    f"{connection}"
+                    "\r\n"
+                )
+                client_socket.sendall(response_headers.encode("utf-8"))
+                return
+            if byte_range is None:
+                start, end = 0, size - 1
+                status = "200 OK"
+                content_range = ""
+            else:
+                start, end = byte_range
+                status = "206 Partial Content"
+                content_range = f"Content-Range: bytes {start}-{end}/{size}\r\n"
+            count = end - start + 1
+            response_headers = (
+                f"HTTP/1.1 {status}\r\n"
+                f"Content-Length: {count}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                "Accept-Ranges: bytes\r\n"
+                f"{content_range}"
+                f"{connection}"
+                "\r\n"
+            )
+            client_socket.sendall(response_headers.encode("utf-8"))
+            if count:
+                client_socket.sendfile(file, start, count)
+
+    def handle_post_request(self, client_socket, path, headers, body, connection=""):
         # Retrieving client name
         client_ip, client_port = client_socket.getpeername()
         print(f"Handling POST request from {client_ip}:{client_port}")
@@ -188,12 +383,13 @@ class Server:
             print("Changing name to: ", name)
             self.sessions[client_ip] = name
 
-            # Prepare HTTP response for name updating
+            # Prepare HTTP response for name updating, the name may not be ascii so count its bytes
             content = f"<html><body><h1>Name updated to {name}</h1></body></html>"
             response_headers = (
                 "HTTP/1.1 200 OK\r\n"
-                f"Content-Length: {len(content)}\r\n"
+                f"Content-Length: {len(content.encode('utf-8'))}\r\n"
                 "Content-Type: text/html\r\n"
+                f"{connection}"
                 "\r\n"
             )
 
@@ -204,6 +400,7 @@ class Server:
                 "HTTP/1.1 404 Not Found\r\n"
                 f"Content-Length: {len(content)}\r\n"
                 "Content-Type: text/html\r\n"
+                f"{connection}"
                 "\r\n"
             )
 
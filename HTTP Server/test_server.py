@@ -2,10 +2,13 @@
 #Elizabeth Dorfman
 #Tests GET and POST requests to server.
 
-import socket, threading, time
+import socket, threading, time, tempfile, os
 from server import Server
+from file_cache import FileCache
+from async_server import AsyncServer
 addr = '127.0.0.1'
 port = 8080
+async_port = 8081
 
 def test_1():# Test 1: Check if the server is running by connecting to it
     with socket.create_connection((addr, port)) as client_socket:
@@ -31,7 +34,7 @@ def test_3():# Test 3: Test a request for a nonexistent file
 
 def test_4():# Test 4: Test a simple POST request
     with socket.create_connection((addr, port)) as client_socket:
-        client_socket.sendall(b"POST /change_name HTTP/1.1\r\nHost: localhost\r\nContent-Length: 9\r\n\r\nname=Alice")
+        client_socket.sendall(b"POST /change_name HTTP/1.1\r\nHost: localhost\r\nContent-Length: 10\r\n\r\nname=Alice")
         response = client_socket.recv(4096).decode()
     with socket.create_connection((addr, port)) as client_socket:
         client_socket.sendall(b"GET / HTTP/1.1\r\nHost: localhost\r\n\r\n")
@@ -40,11 +43,154 @@ def test_4():# Test 4: Test a simple POST request
     if cond:print("Test 4 passed")
     else:print("Test 4 failed")
 
+def test_5():# Test 5: Same routing and sessions on the asyncio server, with many clients connected at once
+    clients = [socket.create_connection((addr, async_port)) for i in range(50)]
+    for client_socket in clients:
+        client_socket.sendall(b"GET /nonexistent.html HTTP/1.1\r\nHost: localhost\r\n\r\n")
+    cond = all("404 Not Found" in client_socket.recv(4096).decode() for client_socket in clients)
+    for client_socket in clients: client_socket.close()
+    with socket.create_connection((addr, async_port)) as client_socket:
+        client_socket.sendall(b"POST /change_name HTTP/1.1\r\nHost: localhost\r\nContent-Length: 8\r\n\r\nname=Bob")
+        response = client_socket.recv(4096).decode()
+        cond = cond and "200 OK" in response and "Bob" in response
+    if cond:print("Test 5 passed")
+    else:print("Test 5 failed")
+
+def test_6():# Test 6: Pipelined requests on one kept alive connection are answered in order until Connection: close
+    with socket.create_connection((addr, port)) as client_socket:
+        client_socket.sendall(b"GET /nonexistent.html HTTP/1.1\r\nHost: localhost\r\n\r\n" * 2)
+        client_socket.sendall(b"POST /change_name HTTP/1.1\r\nHost: localhost\r\nContent-Length: 10\r\nConnection: close\r\n\r\nname=Carol")
+        response = b""
+        while True:
+            data = client_socket.recv(4096)
+            if not data: break
+            response += data
+        response = response.decode()
+        cond = response.count("404 Not Found") == 4 and response.endswith("Name updated to Carol</h1></body></html>")
+    if cond:print("Test 6 passed")
+    else:print("Test 6 failed")
+
+def test_7():# Test 7: Large and chunked POST bodies arrive whole, oversized ones get 413
+    body = b"name=Dave&data=" + b"x" * 200000
+    with socket.create_connection((addr, port)) as client_socket:
+        client_socket.sendall(b"POST /change_name HTTP/1.1\r\nHost: localhost\r\nContent-Length: %d\r\n\r\n" % len(body) + body)
+        cond = "Name updated to Dave<" in client_socket.recv(4096).decode()
+        client_socket.sendall(b"POST /change_name HTTP/1.1\r\nHost: localhost\r\nTransfer-Encoding: chunked\r\n\r\n5\r\nname=\r\n3\r\nEve\r\n0\r\n\r\n")
+        cond = cond and "Name updated to Eve<" in client_socket.recv(4096).decode()
+        client_socket.sendall(b"POST /change_name HTTP/1.1\r\nHost: localhost\r\nContent-Length: 1000000000\r\n\r\n")
+        cond = cond and "413 Payload Too Large" in client_socket.recv(4096).decode()
+    if cond:print("Test 7 passed")
+    else:print("Test 7 failed")
+
+def test_8():# Test 8: File cache renders templates, counts hits and misses, rereads edited files and evicts the least recently used
+    with tempfile.TemporaryDirectory() as directory:
+        paths = [os.path.join(directory, f"page{i}.html") for i in range(3)]
+        for path in paths:
+            with open(path, "w") as file: file.write("<h1>Hello {{name}}</h1>" + "x" * 100)
+        cache = FileCache(200)
+        cond = cache.get(paths[0]).render("Ann").startswith(b"<h1>Hello Ann</h1>")
+        cond = cond and cache.get(paths[0]) is cache.get(paths[0]) and (cache.hits, cache.misses) == (2, 1)
+        with open(paths[0], "w") as file: file.write("<h1>Bye {{name}}</h1>")
+        cond = cond and cache.get(paths[0]).render("Ann") == b"<h1>Bye Ann</h1>" and cache.misses == 2
+        cache.get(paths[1]); cache.get(paths[0]); cache.get(paths[2])
+        cond = cond and list(cache.files) == [paths[0], paths[2]] and cache.evictions == 1 and cache.total_bytes <= 200
+    if cond:print("Test 8 passed")
+    else:print("Test 8 failed")
+
+def read_response(client_socket):# Reads one whole response, headers then Content-Length bytes of body, and nothing of the next response
+    head = b""
+    while not head.endswith(b"\r\n\r\n"):
+        byte = client_socket.recv(1)
+        if not byte: raise ConnectionError("connection closed before the end of the headers")
+        head += byte
+    length = int(head.split(b"Content-Length: ")[1].split(b"\r\n")[0])
+    body = b""
+    while len(body) < length:
+        received = client_socket.recv(min(65536, length - len(body)))
+        if not received: raise ConnectionError("connection closed before the end of the body")
+        body += received
+    return head[:-4].decode(), body
+
+def test_9():# Test 9: Binary files are sent byte for byte with their type, Range gets 206 or 416, on both servers
+    data = bytes(range(256)) * 4000
+    with tempfile.TemporaryDirectory(dir=".") as directory:
+        path = os.path.join(os.path.basename(directory), "data.bin")
+        with open(path, "wb") as file: file.write(data)
+        cond = True
+        for server_port in (port, async_port):
+            with socket.create_connection((addr, server_port)) as client_socket:
+                client_socket.sendall(f"GET /{path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+                head, body = read_response(client_socket)
+                cond = cond and "200 OK" in head and "application/octet-stream" in head and body == data
+                client_socket.sendall(f"GET /{path} HTTP/1.1\r\nHost: localhost\r\nRange: bytes=1000-1999\r\n\r\n".encode())
+                head, body = read_response(client_socket)
+                cond = cond and "206 Partial Content" in head and f"bytes 1000-1999/{len(data)}" in head and body == data[1000:2000]
+                client_socket.sendall(f"GET /{path} HTTP/1.1\r\nHost: localhost\r\nRange: bytes={len(data)}-\r\n\r\n".encode())
+                head, body = read_response(client_socket)
+                cond = cond and "416 Range Not Satisfiable" in head
+                client_socket.sendall("POST /change_name HTTP/1.1\r\nHost: localhost\r\nContent-Length: 13\r\n\r\nname=Zo%C3%AB".encode())
+                head, body = read_response(client_socket)
+                cond = cond and body.decode().endswith("Name updated to Zo\u00eb</h1></body></html>")
+    if cond:print("Test 9 passed")
+    else:print("Test 9 failed")
+
+def test_10():# Test 10: The last response before the server closes says Connection: close, kept alive HTTP/1.0 gets Connection: keep-alive
+    cond = True
+    with socket.create_connection((addr, port)) as client_socket:
+        client_socket.sendall(b"GET /nonexistent.html HTTP/1.0\r\nConnection: keep-alive\r\n\r\n")
+        head, _ = read_response(client_socket)
+        cond = cond and "Connection: keep-alive" in head
+        client_socket.sendall(b"GET /nonexistent.html HTTP/1.1\r\nConnection: close\r\n\r\n")
+        head, _ = read_response(client_socket)
+        cond = cond and "Connection: close" in head and client_socket.recv(4096) == b""
+    for server_class, server_port in ((Server, 8082), (AsyncServer, 8083)):
+        limited_server = server_class(addr, server_port, 1, max_requests=2)
+        limited_thread = threading.Thread(target=limited_server.start_server)
+        limited_thread.start()
+        time.sleep(0.2)
+        with socket.create_connection((addr, server_port)) as client_socket:
+            client_socket.sendall(b"GET /nonexistent.html HTTP/1.1\r\nHost: localhost\r\n\r\n" * 3)
+            first, _ = read_response(client_socket)
+            second, _ = read_response(client_socket)
+            cond = cond and "Connection" not in first and "Connection: close" in second and client_socket.recv(4096) == b""
+        # Stops itself after its one second timeout
+        limited_thread.join()
+    if cond:print("Test 10 passed")
+    else:print("Test 10 failed")
+
+def test_11():# Test 11: Requests on one kept alive connection hold off the server timeout on both servers
+    cond = True
+    for server_class, server_port in ((Server, 8084), (AsyncServer, 8085)):
+        idle_server = server_class(addr, server_port, 1)
+        idle_thread = threading.Thread(target=idle_server.start_server)
+        idle_thread.start()
+        with socket.create_connection((addr, server_port)) as client_socket:
+            # Two seconds of requests, twice the timeout, without a new connection
+            for i in range(4):
+                client_socket.sendall(b"GET /nonexistent.html HTTP/1.1\r\nHost: localhost\r\n\r\n")
+                head, _ = read_response(client_socket)
+                cond = cond and head.startswith("HTTP/1.1 404")
+                time.sleep(0.5)
+            try:
+                with socket.create_connection((addr, server_port)) as new_socket:
+                    new_socket.sendall(b"GET /nonexistent.html HTTP/1.1\r\nConnection: close\r\n\r\n")
+                    head, _ = read_response(new_socket)
+                    cond = cond and head.startswith("HTTP/1.1 404")
+            except OSError:
+                cond = False
+        # Stops itself once a second passes without requests
+        idle_thread.join()
+    if cond:print("Test 11 passed")
+    else:print("Test 11 failed")
+
 if __name__ == "__main__":
     try:
         server = Server(addr, port, 3)
         server_thread = threading.Thread(target=server.start_server)
         server_thread.start()
+        async_server = AsyncServer(addr, async_port, 3, 64)
+        async_server_thread = threading.Thread(target=async_server.start_server)
+        async_server_thread.start()
         time.sleep(1)
     except Exception as e:
         print(e)
@@ -52,7 +198,16 @@ if __name__ == "__main__":
     test_2()
     test_3()
     test_4()
+    test_5()
+    test_6()
+    test_7()
+    test_8()
+    test_9()
+    test_10()
+    test_11()
     try:
         server.stop_server()
         server_thread.join()
+        async_server.stop_server()
+        async_server_thread.join()
     except Exception:pass